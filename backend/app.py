@@ -1,30 +1,77 @@
-from decimal import Decimal, ROUND_HALF_UP
+import asyncio
+import base64
+import json
+from contextlib import asynccontextmanager
+from decimal import Decimal, InvalidOperation
 from typing import List, Optional
-from fastapi import FastAPI, HTTPException, Depends, status, Query
+from fastapi import FastAPI, HTTPException, Depends, status, Query, Header, Request, Response
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from sqlalchemy import func, or_
-from datetime import datetime
+from fastapi.responses import ORJSONResponse, PlainTextResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.exc import IntegrityError, OperationalError
+from pydantic import ValidationError
+from datetime import date, datetime, timedelta
 
-from backend.database import get_db, create_tables
-from backend.models import User, Product, Coupon, Order, OrderItem
+from backend.catalog import (
+    ensure_catalog_state, get_catalog_version, bump_catalog_version, catalog_cache,
+    count_cache, get_product_count, get_category_counts, adjust_product_counters,
+    make_etag, combine_etags, etag_matches, CATALOG_CACHE_CONTROL
+)
+from backend.checkout import (
+    CHECKOUT_MAX_RETRIES, is_database_locked, retry_delay, place_order, checkout_pipeline
+)
+from backend.database import async_engine, get_async_db, create_tables
+from backend.exporter import export_orders
+from backend.idempotency import (
+    acquire_key, release_key, request_fingerprint, find_stored_response, purge_expired_keys
+)
+from backend.importer import detect_import_format, import_products
+from backend.metrics import METRICS_ENABLED, MetricsMiddleware, render_metrics
+from backend.models import User, Product, Order, DailySales, ProductSales, IdempotencyKey
+from backend.pricing import (
+    group_quantities, load_products, find_coupon, coupon_status, price_cart
+)
+from backend.profiler import QueryProfilerMiddleware
 from backend.schemas import (
     UserCreate, UserLogin, UserResponse, Token,
-    ProductCreate, ProductUpdate, ProductResponse, ProductsListResponse,
-    CouponValidateResponse, OrderCreate, OrderResponse
+    ProductCreate, ProductUpdate, ProductResponse, ProductsListResponse, ProductImportResponse,
+    ProductBatchRequest, ProductBatchResponse,
+    CouponValidateResponse, CartQuoteResponse, OrderCreate, OrderResponse, DailySalesResponse, TopProductResponse
+)
+from backend.serializers import (
+    serialize_decimal, serialize_product, serialize_order, dump_json, json_response
+)
+from backend.search import (
+    create_search_index, fts_enabled, build_match_query, match_subquery,
+    index_product, remove_product
 )
 from backend.security import (
-    hash_password, authenticate_user, create_access_token, get_current_user
+    hash_password_async, authenticate_user, create_access_token, get_current_user
 )
 
-# Criar tabelas
+# Criar tabelas e índice de busca
 create_tables()
+create_search_index()
+ensure_catalog_state()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if checkout_pipeline.enabled:
+        checkout_pipeline.start()
+    yield
+    # Parar o escritor de pedidos e fechar as conexões do pool assíncrono
+    await checkout_pipeline.stop()
+    await async_engine.dispose()
 
 # Instanciar FastAPI
 app = FastAPI(
     title="Loja Escolar API",
     description="API para e-commerce de produtos escolares",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # Configurar CORS
@@ -42,19 +89,59 @@ app.add_middleware(
     ],
     allow_credentials=False,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-    allow_headers=["Authorization", "Content-Type"],
+    allow_headers=["Authorization", "Content-Type", "If-None-Match", "Idempotency-Key"],
+    expose_headers=["ETag", "Idempotent-Replayed"],
 )
 
+# Consultas SQL por requisição (Server-Timing em modo debug e log de consultas lentas)
+app.add_middleware(QueryProfilerMiddleware)
+
+# Métricas por rota (middleware mais externo, mede também o CORS)
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 # Utilitários
-def serialize_decimal(value: Decimal) -> str:
-    """Serializa Decimal para string"""
-    return str(value.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP))
+def encode_cursor(sort: str, order: str, key, product_id: int) -> str:
+    """Gera cursor opaco com a última chave de ordenação vista (sort key, id)"""
+    if isinstance(key, Decimal):
+        key = serialize_decimal(key)
+    payload = json.dumps({"s": sort, "o": order, "k": key, "id": product_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, sort: str, order: str):
+    """Decodifica o cursor e retorna (sort key, id)"""
+    invalid_cursor = HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Cursor inválido"
+    )
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        key, last_id = payload["k"], int(payload["id"])
+        if payload["s"] != sort or payload["o"] != order:
+            raise invalid_cursor
+        if sort == "price":
+            key = Decimal(key)
+        elif not isinstance(key, (str, int, float)) or isinstance(key, bool):
+            raise invalid_cursor
+    except HTTPException:
+        raise
+    except (ValueError, KeyError, TypeError, InvalidOperation):
+        raise invalid_cursor
+    return key, last_id
+
+def conditional_response(body: bytes, etag: str, if_none_match: Optional[str]) -> Response:
+    """Retorna 304 se o cliente já possui o ETag atual, senão o corpo com ETag e Cache-Control"""
+    headers = {"ETag": etag, "Cache-Control": CATALOG_CACHE_CONTROL}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return json_response(body, headers=headers)
 
 # Rotas de Autenticação
 @app.post("/auth/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def register(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register(user_data: UserCreate, db: AsyncSession = Depends(get_async_db)):
     # Verificar se email já existe
-    existing_user = db.query(User).filter(User.email == user_data.email).first()
+    existing_user = await db.scalar(select(User).where(User.email == user_data.email))
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
@@ -65,17 +152,17 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
     user = User(
         name=user_data.name,
         email=user_data.email,
-        password_hash=hash_password(user_data.password)
+        password_hash=await hash_password_async(user_data.password)
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     
     return user
 
 @app.post("/auth/login", response_model=Token)
-async def login(user_data: UserLogin, db: Session = Depends(get_db)):
-    user = authenticate_user(db, user_data.email, user_data.password)
+async def login(user_data: UserLogin, db: AsyncSession = Depends(get_async_db)):
+    user = await authenticate_user(db, user_data.email, user_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -88,100 +175,233 @@ async def login(user_data: UserLogin, db: Session = Depends(get_db)):
 # Rotas de Produtos
 @app.get("/products", response_model=ProductsListResponse)
 async def list_products(
-    search: Optional[str] = Query(None, description="Buscar por nome"),
-    sort: Optional[str] = Query("name", pattern="^(price|name)$", description="Ordenar por price ou name"),
+    search: Optional[str] = Query(None, description="Buscar por nome, descrição, categoria ou SKU"),
+    sort: Optional[str] = Query("name", pattern="^(price|name|relevance)$", description="Ordenar por price, name ou relevance (asc = mais relevante primeiro)"),
     order: Optional[str] = Query("asc", pattern="^(asc|desc)$", description="Ordem asc ou desc"),
     page: int = Query(1, ge=1, description="Página"),
     page_size: int = Query(12, ge=1, le=100, description="Itens por página"),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="Cursor opaco (meta.next_cursor) para paginação por chave"),
+    category: Optional[str] = Query(None, description="Filtrar por categoria"),
+    min_price: Optional[Decimal] = Query(None, ge=0, description="Preço mínimo"),
+    max_price: Optional[Decimal] = Query(None, ge=0, description="Preço máximo"),
+    in_stock: Optional[bool] = Query(None, description="true = apenas com estoque, false = apenas esgotados"),
+    facets: bool = Query(True, description="Incluir contagem por categoria em meta.facets"),
+    count: str = Query("exact", pattern="^(exact|estimate|none)$", description="Total exato, estimado (cache curto) ou sem contagem"),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    # Query base
-    query = db.query(Product)
+    # Responder do cache se o catálogo não mudou desde a consulta anterior
+    version = await get_catalog_version(db)
+    cache_key = (
+        "list", version, search, sort, order, page, page_size, cursor,
+        category, min_price, max_price, in_stock, facets, count
+    )
+    cached = catalog_cache.get(cache_key)
+    if cached is not None:
+        # Cliente já possui esta página: 304 sem carregar nem serializar produtos
+        body, etag = cached
+        return conditional_response(body, etag, if_none_match)
+    
+    # Query base e query de facetas (contagem por categoria)
+    query = select(Product)
+    facet_query = select(Product.category, func.count()).group_by(Product.category).order_by(Product.category)
+    rank_column = None
+    filters = []
     
-    # Aplicar busca
+    # Aplicar busca: FTS5 com prefixo e ranking bm25, LIKE se FTS5 indisponível
     if search:
-        search_term = f"%{search.lower()}%"
-        query = query.filter(func.lower(Product.name).like(search_term))
+        match = build_match_query(search) if fts_enabled() else None
+        if match:
+            fts = match_subquery(match)
+            query = query.join(fts, fts.c.product_id == Product.id)
+            facet_query = facet_query.join(fts, fts.c.product_id == Product.id)
+            rank_column = fts.c.rank
+        else:
+            search_term = f"%{search.lower()}%"
+            filters.append(func.lower(Product.name).like(search_term))
     
-    # Contar total
-    total = query.count()
+    # Aplicar filtros de preço e estoque
+    if min_price is not None:
+        filters.append(Product.price >= min_price)
+    if max_price is not None:
+        filters.append(Product.price <= max_price)
+    if in_stock is True:
+        filters.append(Product.stock > 0)
+    elif in_stock is False:
+        filters.append(Product.stock == 0)
+    query = query.where(*filters)
     
-    # Aplicar ordenação
-    if sort == "price":
-        if order == "desc":
-            query = query.order_by(Product.price.desc())
+    # Facetas ignoram o próprio filtro de categoria, para a barra lateral listar todas
+    facets_data = None
+    if facets:
+        if not search and not filters:
+            facet_rows = await get_category_counts(db)
         else:
-            query = query.order_by(Product.price.asc())
-    else:  # sort == "name"
+            facet_rows = (await db.execute(facet_query.where(*filters))).all()
+        facets_data = {
+            "categories": [{"name": name, "count": count} for name, count in facet_rows]
+        }
+    
+    if category:
+        query = query.where(Product.category == category)
+    
+    # Contar total: contadores mantidos sem filtros, cache curto para buscas filtradas
+    if count == "none":
+        total = None
+    elif not search and not filters:
+        total = await get_product_count(db, category)
+    else:
+        # exact: válido só na versão atual; estimate: reaproveitado entre versões até o TTL
+        count_key = (
+            version if count == "exact" else None,
+            search, category, min_price, max_price, in_stock
+        )
+        total = count_cache.get(count_key)
+        if total is None:
+            total = await db.scalar(select(func.count()).select_from(query.subquery()))
+            count_cache.set(count_key, total)
+    
+    # Aplicar ordenação (id como desempate garante ordem total para o cursor)
+    if sort == "price":
+        sort_column = Product.price
+    elif sort == "relevance" and rank_column is not None:
+        sort_column = rank_column
+    else:
+        sort_column = Product.name
+    query = query.add_columns(sort_column)
+    if order == "desc":
+        query = query.order_by(sort_column.desc(), Product.id.desc())
+    else:
+        query = query.order_by(sort_column.asc(), Product.id.asc())
+    
+    # Aplicar paginação: por cursor (keyset) ou por offset
+    if cursor:
+        last_key, last_id = decode_cursor(cursor, sort, order)
         if order == "desc":
-            query = query.order_by(Product.name.desc())
+            query = query.where(tuple_(sort_column, Product.id) < tuple_(last_key, last_id))
         else:
-            query = query.order_by(Product.name.asc())
+            query = query.where(tuple_(sort_column, Product.id) > tuple_(last_key, last_id))
+    else:
+        query = query.offset((page - 1) * page_size)
     
-    # Aplicar paginação
-    offset = (page - 1) * page_size
-    products = query.offset(offset).limit(page_size).all()
+    # Buscar um item extra para saber se existe próxima página
+    rows = (await db.execute(query.limit(page_size + 1))).all()
+    has_next = len(rows) > page_size
+    rows = rows[:page_size]
+    next_cursor = encode_cursor(sort, order, rows[-1][1], rows[-1][0].id) if has_next else None
+    products = [row[0] for row in rows]
     
     # Serializar produtos
-    products_data = []
-    for product in products:
-        product_dict = {
-            "id": product.id,
-            "name": product.name,
-            "description": product.description,
-            "price": serialize_decimal(product.price),
-            "stock": product.stock,
-            "category": product.category,
-            "sku": product.sku,
-            "image_url": product.image_url,
-            "created_at": product.created_at,
-            "updated_at": product.updated_at
-        }
-        products_data.append(product_dict)
+    products_data = [serialize_product(product) for product in products]
     
-    return {
+    body = {
         "data": products_data,
         "meta": {
             "total": total,
-            "page": page,
+            "count": count,
+            "page": None if cursor else page,
             "page_size": page_size,
             "sort": sort,
             "order": order,
-            "search": search
+            "search": search,
+            "cursor": cursor,
+            "next_cursor": next_cursor,
+            "category": category,
+            "min_price": serialize_decimal(min_price) if min_price is not None else None,
+            "max_price": serialize_decimal(max_price) if max_price is not None else None,
+            "in_stock": in_stock,
+            "facets": facets_data
         }
     }
+    etag = make_etag(version, cache_key, products_data)
+    body = dump_json(body)
+    catalog_cache.set(cache_key, (body, etag))
+    return conditional_response(body, etag, if_none_match)
+
+def product_cache_entry(version: int, product: Product) -> tuple:
+    """Serializa o produto e guarda (corpo, ETag) no cache do catálogo"""
+    cache_key = ("product", version, product.id)
+    body = serialize_product(product)
+    entry = (dump_json(body), make_etag(version, cache_key, [body]))
+    catalog_cache.set(cache_key, entry)
+    return entry
+
+def parse_product_ids(raw: str) -> list:
+    """Converte '3,1,2' em [3, 1, 2] com as mesmas validações do corpo do POST (422)"""
+    try:
+        return ProductBatchRequest(ids=[value.strip() for value in raw.split(",") if value.strip()]).ids
+    except ValidationError as e:
+        raise RequestValidationError([{**error, "loc": ("query", *error["loc"])} for error in e.errors()])
+
+async def products_batch_response(product_ids: list, if_none_match: Optional[str], db: AsyncSession) -> Response:
+    """Produtos na ordem pedida, reaproveitando o cache de /products/{id}; ausentes em missing_ids"""
+    # Tamanho e IDs positivos já validados por ProductBatchRequest
+    product_ids = list(dict.fromkeys(product_ids))
+    
+    version = await get_catalog_version(db)
+    entries = {}
+    for product_id in product_ids:
+        cached = catalog_cache.get(("product", version, product_id))
+        if cached is not None:
+            entries[product_id] = cached
+    
+    # Os que faltam no cache vêm em uma única consulta
+    pending_ids = [product_id for product_id in product_ids if product_id not in entries]
+    if pending_ids:
+        for product in (await db.scalars(select(Product).where(Product.id.in_(pending_ids)))).all():
+            entries[product.id] = product_cache_entry(version, product)
+    
+    found = [entries[product_id] for product_id in product_ids if product_id in entries]
+    missing_ids = [product_id for product_id in product_ids if product_id not in entries]
+    # Corpos dos produtos já serializados são concatenados sem nova serialização
+    body = b'{"data":[' + b",".join(entry[0] for entry in found) + b'],"missing_ids":' + dump_json(missing_ids) + b"}"
+    etag = combine_etags(version, ("batch", tuple(product_ids)), [entry[1] for entry in found])
+    return conditional_response(body, etag, if_none_match)
+
+@app.get("/products/batch", response_model=ProductBatchResponse)
+async def get_products_batch(
+    ids: str = Query(..., description="IDs separados por vírgula, ex.: 3,1,2"),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    return await products_batch_response(parse_product_ids(ids), if_none_match, db)
+
+@app.post("/products/batch", response_model=ProductBatchResponse)
+async def post_products_batch(batch: ProductBatchRequest, db: AsyncSession = Depends(get_async_db)):
+    # Variante para listas longas demais para a URL
+    return await products_batch_response(batch.ids, None, db)
 
 @app.get("/products/{product_id}", response_model=ProductResponse)
-async def get_product(product_id: int, db: Session = Depends(get_db)):
-    product = db.query(Product).filter(Product.id == product_id).first()
+async def get_product(
+    product_id: int,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    version = await get_catalog_version(db)
+    cached = catalog_cache.get(("product", version, product_id))
+    if cached is not None:
+        body, etag = cached
+        return conditional_response(body, etag, if_none_match)
+    
+    product = await db.get(Product, product_id)
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Produto não encontrado"
         )
     
-    return {
-        "id": product.id,
-        "name": product.name,
-        "description": product.description,
-        "price": serialize_decimal(product.price),
-        "stock": product.stock,
-        "category": product.category,
-        "sku": product.sku,
-        "image_url": product.image_url,
-        "created_at": product.created_at,
-        "updated_at": product.updated_at
-    }
+    body, etag = product_cache_entry(version, product)
+    return conditional_response(body, etag, if_none_match)
 
 @app.post("/products", response_model=ProductResponse, status_code=status.HTTP_201_CREATED)
 async def create_product(
     product_data: ProductCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     # Verificar SKU único se fornecido
     if product_data.sku:
-        existing_sku = db.query(Product).filter(Product.sku == product_data.sku).first()
+        existing_sku = await db.scalar(select(Product).where(Product.sku == product_data.sku))
         if existing_sku:
             raise HTTPException(
                 status_code=status.HTTP_409_CONFLICT,
@@ -198,30 +418,41 @@ async def create_product(
         image_url=product_data.image_url
     )
     db.add(product)
-    db.commit()
-    db.refresh(product)
+    await db.flush()
+    await db.run_sync(index_product, product)
+    await db.run_sync(adjust_product_counters, product.category, 1)
+    await db.run_sync(bump_catalog_version)
+    await db.commit()
+    await db.refresh(product)
     
-    return {
-        "id": product.id,
-        "name": product.name,
-        "description": product.description,
-        "price": serialize_decimal(product.price),
-        "stock": product.stock,
-        "category": product.category,
-        "sku": product.sku,
-        "image_url": product.image_url,
-        "created_at": product.created_at,
-        "updated_at": product.updated_at
-    }
+    return json_response(serialize_product(product), status_code=status.HTTP_201_CREATED)
+
+@app.post("/products/import", response_model=ProductImportResponse)
+async def import_products_route(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$", description="Formato do arquivo (padrão: pelo Content-Type)"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    import_format = format or detect_import_format(request.headers.get("content-type"))
+    if not import_format:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Envie o arquivo como CSV (text/csv) ou NDJSON (application/x-ndjson)"
+        )
+    
+    # Corpo lido em streaming e gravado em lotes com upsert por SKU
+    report = await import_products(db, request.stream(), import_format)
+    return json_response(report)
 
 @app.put("/products/{product_id}", response_model=ProductResponse)
 async def update_product(
     product_id: int,
     product_data: ProductUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = await db.get(Product, product_id)
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -230,7 +461,7 @@ async def update_product(
     
     # Verificar SKU único se alterado
     if product_data.sku and product_data.sku != product.sku:
-        existing_sku = db.query(Product).filter(Product.sku == product_data.sku).first()
+        existing_sku = await db.scalar(select(Product).where(Product.sku == product_data.sku))
         if existing_sku:
             raise HTTPException(
                 status_code=status.HTTP_409_CONFLICT,
@@ -238,96 +469,129 @@ async def update_product(
             )
     
     # Atualizar campos fornecidos
+    previous_category = product.category
     update_data = product_data.dict(exclude_unset=True)
     for field, value in update_data.items():
         setattr(product, field, value)
     
+    # Mover o produto entre os contadores se a categoria mudou
+    if product.category != previous_category:
+        await db.run_sync(adjust_product_counters, previous_category, -1)
+        await db.run_sync(adjust_product_counters, product.category, 1)
+    
     product.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(product)
+    await db.run_sync(index_product, product)
+    await db.run_sync(bump_catalog_version)
+    await db.commit()
+    await db.refresh(product)
     
-    return {
-        "id": product.id,
-        "name": product.name,
-        "description": product.description,
-        "price": serialize_decimal(product.price),
-        "stock": product.stock,
-        "category": product.category,
-        "sku": product.sku,
-        "image_url": product.image_url,
-        "created_at": product.created_at,
-        "updated_at": product.updated_at
-    }
+    return json_response(serialize_product(product))
 
 @app.delete("/products/{product_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_product(
     product_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = await db.get(Product, product_id)
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Produto não encontrado"
         )
     
-    db.delete(product)
-    db.commit()
+    await db.run_sync(remove_product, product.id)
+    await db.run_sync(adjust_product_counters, product.category, -1)
+    await db.run_sync(bump_catalog_version)
+    await db.delete(product)
+    await db.commit()
 
 # Rotas de Cupom
 @app.get("/coupons/{code}/validate", response_model=CouponValidateResponse)
-async def validate_coupon(code: str, db: Session = Depends(get_db)):
-    coupon = db.query(Coupon).filter(
-        func.lower(Coupon.code) == code.lower(),
-        Coupon.active == True
-    ).first()
-    
-    if not coupon:
-        return {
-            "valid": False,
-            "discount_percent": 0,
-            "code": code,
-            "message": "Cupom não encontrado ou inativo"
-        }
+async def validate_coupon(code: str, db: AsyncSession = Depends(get_async_db)):
+    return coupon_status(code, await find_coupon(db, code))
+
+# Rotas de Carrinho
+@app.post("/cart/quote", response_model=CartQuoteResponse)
+async def quote_cart(cart: OrderCreate, db: AsyncSession = Depends(get_async_db)):
+    # Preço, disponibilidade, desconto e total do carrinho, sem reservar estoque
+    quantities = group_quantities(cart.items)
+    products = await load_products(db, quantities.keys())
+    coupon = await find_coupon(db, cart.coupon_code) if cart.coupon_code else None
+    pricing = price_cart(products, quantities, coupon)
     
-    # Verificar expiração
-    if coupon.valid_until and coupon.valid_until < datetime.utcnow():
-        return {
-            "valid": False,
-            "discount_percent": 0,
-            "code": code,
-            "message": "Cupom expirado"
+    items = [
+        {
+            "product_id": line["product_id"],
+            "name": line["name"],
+            "quantity": line["quantity"],
+            "unit_price": serialize_decimal(line["unit_price"]),
+            "line_total": serialize_decimal(line["line_total"]),
+            "stock": line["product"].stock,
+            "available": line["product"].stock >= line["quantity"]
         }
-    
-    return {
-        "valid": True,
-        "discount_percent": coupon.discount_percent,
-        "code": coupon.code,
-        "message": "Cupom válido"
-    }
+        for line in pricing["lines"]
+    ]
+    missing_ids = [product_id for product_id in quantities if product_id not in products]
+    return json_response({
+        "items": items,
+        "missing_product_ids": missing_ids,
+        "coupon": coupon_status(cart.coupon_code, coupon) if cart.coupon_code else None,
+        "subtotal": serialize_decimal(pricing["subtotal"]),
+        "discount_amount": serialize_decimal(pricing["discount_amount"]),
+        "total_final": serialize_decimal(pricing["total_final"]),
+        # Mesmas condições que a confirmação verifica antes de reservar o estoque
+        "can_checkout": not missing_ids and all(item["available"] for item in items)
+    })
 
 # Rotas de Pedido
+def replay_order_response(stored: IdempotencyKey, request_hash: str) -> Response:
+    """Repete a resposta gravada para a chave de idempotência"""
+    if stored.request_hash != request_hash:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key já utilizada com outro pedido"
+        )
+    return json_response(stored.response, status_code=stored.status_code, headers={"Idempotent-Replayed": "true"})
+
 @app.post("/orders/confirm", response_model=OrderResponse, status_code=status.HTTP_201_CREATED)
-async def confirm_order(order_data: OrderCreate, db: Session = Depends(get_db)):
+async def confirm_order(
+    order_data: OrderCreate,
+    db: AsyncSession = Depends(get_async_db),
+    idempotency_key: Optional[str] = Header(
+        None, min_length=1, max_length=255, description="Chave para repetir a confirmação sem duplicar o pedido"
+    )
+):
+    idempotency = None
+    if idempotency_key:
+        # Repetições simultâneas da mesma chave aguardam a tentativa em andamento
+        await acquire_key(idempotency_key)
     try:
-        # Iniciar transação
-        # Validar produtos e calcular subtotal
-        subtotal = Decimal('0.00')
-        order_items_data = []
+        if idempotency_key:
+            # Chave já usada: devolve a resposta gravada sem tocar nos produtos
+            request_hash = request_fingerprint(order_data.dict())
+            stored = await find_stored_response(db, idempotency_key)
+            if stored:
+                return replay_order_response(stored, request_hash)
+            idempotency = (idempotency_key, request_hash)
         
-        for item in order_data.items:
-            product = db.query(Product).filter(Product.id == item.product_id).first()
-            if not product:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail=f"Produto com ID {item.product_id} não encontrado"
-                )
+        # Carregar todos os produtos em uma única consulta
+        quantities = group_quantities(order_data.items)
+        products = await load_products(db, quantities.keys())
+        missing_ids = [product_id for product_id in quantities if product_id not in products]
+        if missing_ids:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Produtos não encontrados: IDs {', '.join(str(product_id) for product_id in missing_ids)}"
+            )
+        
+        for product_id, quantity in quantities.items():
+            product = products[product_id]
             
-            if product.stock < item.quantity:
+            if product.stock < quantity:
                 raise HTTPException(
                     status_code=status.HTTP_409_CONFLICT,
-                    detail=f"Estoque insuficiente para {product.name}. Disponível: {product.stock}, solicitado: {item.quantity}"
+                    detail=f"Estoque insuficiente para {product.name}. Disponível: {product.stock}, solicitado: {quantity}"
                 )
             
             if product.stock == 0:
@@ -335,105 +599,177 @@ async def confirm_order(order_data: OrderCreate, db: Session = Depends(get_db)):
                     status_code=status.HTTP_409_CONFLICT,
                     detail=f"Produto {product.name} está fora de estoque"
                 )
-            
-            line_total = product.price * item.quantity
-            subtotal += line_total
-            
-            order_items_data.append({
-                "product": product,
-                "quantity": item.quantity,
-                "unit_price": product.price,
-                "line_total": line_total
-            })
         
-        # Aplicar cupom se fornecido
-        discount_amount = Decimal('0.00')
-        if order_data.coupon_code:
-            coupon = db.query(Coupon).filter(
-                func.lower(Coupon.code) == order_data.coupon_code.lower(),
-                Coupon.active == True
-            ).first()
-            
-            if coupon and (not coupon.valid_until or coupon.valid_until > datetime.utcnow()):
-                discount_amount = (subtotal * Decimal(str(coupon.discount_percent)) / Decimal('100')).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        # Mesmo cálculo da cotação do carrinho (linhas, cupom e totais)
+        # Cupom lido do banco (sem cache): ativação/desativação vale na hora
+        coupon = await find_coupon(db, order_data.coupon_code, use_cache=False) if order_data.coupon_code else None
+        pricing = price_cart(products, quantities, coupon)
+        order_items_data = pricing["lines"]
         
-        # Calcular total final
-        total_final = (subtotal - discount_amount).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        order_values = {
+            "user_id": None,  # Permitir pedido sem login
+            "subtotal": pricing["subtotal"],
+            "discount_amount": pricing["discount_amount"],
+            "total_final": pricing["total_final"]
+        }
         
-        # Criar pedido
-        order = Order(
-            user_id=None,  # Permitir pedido sem login
-            subtotal=subtotal.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP),
-            discount_amount=discount_amount,
-            total_final=total_final
-        )
-        db.add(order)
-        db.commit()
-        db.refresh(order)
+        if checkout_pipeline.enabled:
+            # Escritor único agrupa pedidos simultâneos em uma transação;
+            # a conexão desta sessão é devolvida ao pool enquanto aguarda
+            await db.commit()
+            try:
+                order, order_items, lost_ids = await checkout_pipeline.submit(order_values, order_items_data, idempotency)
+            except OperationalError:
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Sistema ocupado ao confirmar pedido, tente novamente"
+                )
+        else:
+            # Criar pedido, reservar estoque e gravar itens em uma única transação,
+            # retentando com backoff enquanto o SQLite estiver bloqueado
+            attempt = 0
+            while True:
+                order = Order(**order_values)
+                try:
+                    order_items, lost_ids = await db.run_sync(place_order, order, order_items_data, idempotency)
+                    break
+                except OperationalError as e:
+                    await db.rollback()
+                    if not is_database_locked(e) or attempt >= CHECKOUT_MAX_RETRIES:
+                        raise HTTPException(
+                            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="Sistema ocupado ao confirmar pedido, tente novamente"
+                        )
+                    await asyncio.sleep(retry_delay(attempt))
+                    attempt += 1
         
-        # Criar itens do pedido e reduzir estoque
-        order_items = []
-        for item_data in order_items_data:
-            order_item = OrderItem(
-                order_id=order.id,
-                product_id=item_data["product"].id,
-                quantity=item_data["quantity"],
-                unit_price=item_data["unit_price"],
-                line_total=item_data["line_total"]
+        # Linhas que perderam a disputa por estoque para outro pedido concorrente
+        if lost_ids:
+            lost_names = ", ".join(
+                f"{item_data['name']} (ID {item_data['product_id']}, solicitado: {item_data['quantity']})"
+                for item_data in order_items_data
+                if item_data["product_id"] in lost_ids
+            )
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Estoque esgotado durante a confirmação para: {lost_names}"
             )
-            db.add(order_item)
-            
-            # Reduzir estoque
-            item_data["product"].stock -= item_data["quantity"]
-            
-            order_items.append(order_item)
-        
-        db.commit()
-        
-        # Buscar pedido completo com relacionamentos
-        order_complete = db.query(Order).filter(Order.id == order.id).first()
         
-        # Preparar resposta
-        items_response = []
-        for item in order_complete.items:
-            items_response.append({
-                "id": item.id,
-                "product_id": item.product_id,
-                "quantity": item.quantity,
-                "unit_price": serialize_decimal(item.unit_price),
-                "line_total": serialize_decimal(item.line_total),
-                "product": {
-                    "id": item.product.id,
-                    "name": item.product.name,
-                    "description": item.product.description,
-                    "price": serialize_decimal(item.product.price),
-                    "stock": item.product.stock,
-                    "category": item.product.category,
-                    "sku": item.product.sku,
-                    "image_url": item.product.image_url,
-                    "created_at": item.product.created_at,
-                    "updated_at": item.product.updated_at
-                }
-            })
+        if idempotency:
+            await purge_expired_keys(db)
         
-        return {
-            "id": order_complete.id,
-            "user_id": order_complete.user_id,
-            "subtotal": serialize_decimal(order_complete.subtotal),
-            "discount_amount": serialize_decimal(order_complete.discount_amount),
-            "total_final": serialize_decimal(order_complete.total_final),
-            "created_at": order_complete.created_at,
-            "items": items_response
-        }
+        # Resposta montada com os objetos já em memória (sem novas consultas)
+        return json_response(serialize_order(order, order_items), status_code=status.HTTP_201_CREATED)
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         if isinstance(e, HTTPException):
             raise e
+        if isinstance(e, IntegrityError) and idempotency:
+            # Outro processo gravou a mesma chave primeiro: este pedido foi desfeito
+            stored = await find_stored_response(db, idempotency_key)
+            if stored:
+                return replay_order_response(stored, request_hash)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Erro interno do servidor ao confirmar pedido"
         )
+    finally:
+        if idempotency_key:
+            release_key(idempotency_key)
+
+@app.get("/orders/export")
+async def export_orders_route(
+    format: str = Query("ndjson", pattern="^(csv|ndjson)$", description="Formato do arquivo"),
+    date_from: Optional[datetime] = Query(None, description="Pedidos criados a partir desta data"),
+    date_to: Optional[datetime] = Query(None, description="Pedidos criados antes desta data"),
+    after_id: Optional[int] = Query(None, gt=0, description="Retomar após este pedido (último ID recebido)"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    # Ponto de retomada: (created_at, id) do último pedido recebido
+    resume_after = None
+    if after_id is not None:
+        resume_after = (await db.execute(
+            select(Order.created_at, Order.id).where(Order.id == after_id)
+        )).first()
+        if resume_after is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Pedido de retomada não encontrado"
+            )
+    
+    media_type = "text/csv; charset=utf-8" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        export_orders(format, date_from, date_to, tuple(resume_after) if resume_after else None),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="orders.{format}"'}
+    )
+
+# Rotas de Relatórios (leem apenas os consolidados de vendas)
+@app.get("/reports/sales/daily", response_model=List[DailySalesResponse])
+async def sales_by_day(
+    date_from: Optional[date] = Query(None, description="Primeiro dia (padrão: 30 dias atrás)"),
+    date_to: Optional[date] = Query(None, description="Último dia, inclusive (padrão: hoje)"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    date_to = date_to or datetime.utcnow().date()
+    date_from = date_from or date_to - timedelta(days=29)
+    if date_from > date_to:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="date_from deve ser anterior ou igual a date_to"
+        )
+    
+    rows = await db.scalars(
+        select(DailySales)
+        .where(DailySales.day >= date_from, DailySales.day <= date_to)
+        .order_by(DailySales.day)
+    )
+    return json_response([
+        {
+            "day": row.day,
+            "order_count": row.order_count,
+            "units": row.units,
+            "revenue": serialize_decimal(row.revenue),
+            "discount": serialize_decimal(row.discount),
+            "net_revenue": serialize_decimal(row.revenue - row.discount)
+        }
+        for row in rows
+    ])
+
+@app.get("/reports/sales/top-products", response_model=List[TopProductResponse])
+async def top_products(
+    limit: int = Query(10, ge=1, le=100, description="Quantidade de produtos"),
+    by: str = Query("revenue", pattern="^(revenue|units)$", description="Ordenar por receita ou unidades"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    rank_column = ProductSales.revenue if by == "revenue" else ProductSales.units
+    rows = await db.execute(
+        select(ProductSales, Product.name, Product.sku)
+        .outerjoin(Product, Product.id == ProductSales.product_id)
+        .order_by(rank_column.desc(), ProductSales.product_id)
+        .limit(limit)
+    )
+    return json_response([
+        {
+            "product_id": sales.product_id,
+            "name": name,
+            "sku": sku,
+            "order_count": sales.order_count,
+            "units": sales.units,
+            "revenue": serialize_decimal(sales.revenue)
+        }
+        for sales, name, sku in rows
+    ])
+
+# Métricas no formato do Prometheus
+if METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 # Rota raiz
 @app.get("/")
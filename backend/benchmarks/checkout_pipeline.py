@@ -0,0 +1,102 @@
+"""Benchmark de pedidos por segundo: confirmação atual x pipeline com escritor único (group commit).
+
+Uso: python -m backend.benchmarks.checkout_pipeline [--seconds 10] [--concurrency 64]
+         [--batch-size 64] [--max-wait-ms 2] [--synchronous NORMAL|FULL]
+
+Usa um banco SQLite temporário com produtos de estoque alto.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from collections import Counter
+
+def parse_args():
+    """Argumentos da linha de comando"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--max-wait-ms", type=float, default=2)
+    parser.add_argument("--synchronous", default="NORMAL", help="PRAGMA synchronous do SQLite (FULL = fsync a cada commit)")
+    return parser.parse_args()
+
+async def run_mode(app, product_ids: list, seconds: float, concurrency: int) -> dict:
+    """Clientes simultâneos confirmando pedidos de 1 a 3 produtos durante o tempo indicado"""
+    import httpx
+    latencies, statuses = [], Counter()
+    deadline = time.perf_counter() + seconds
+
+    async def client_loop(client, rng):
+        while time.perf_counter() < deadline:
+            items = [{"product_id": product_id, "quantity": 1} for product_id in rng.sample(product_ids, rng.randint(1, 3))]
+            started = time.perf_counter()
+            response = await client.post("/orders/confirm", json={"items": items})
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] += 1
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(client_loop(client, random.Random(index)) for index in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    quantiles = statistics.quantiles(latencies, n=100)
+    return {
+        "orders_per_second": statuses[201] / elapsed,
+        "p50_ms": quantiles[49] * 1000,
+        "p95_ms": quantiles[94] * 1000,
+        "statuses": dict(statuses)
+    }
+
+async def run(args, product_ids: list) -> dict:
+    """Executa o modo atual e o pipeline em sequência sobre o mesmo banco"""
+    from backend.app import app
+    from backend.checkout import checkout_pipeline
+    from backend.database import async_engine
+
+    checkout_pipeline.max_batch_size = args.batch_size
+    checkout_pipeline.max_wait = args.max_wait_ms / 1000
+
+    results = {}
+    for mode, enabled in (("atual", False), ("pipeline", True)):
+        checkout_pipeline.enabled = enabled
+        results[mode] = await run_mode(app, product_ids, args.seconds, args.concurrency)
+    await checkout_pipeline.stop()
+    await async_engine.dispose()
+    return results
+
+def main():
+    args = parse_args()
+    # O banco e os pragmas precisam ser definidos antes de importar o backend
+    bench_dir = tempfile.mkdtemp(prefix="loja-checkout-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{bench_dir}/bench.db"
+    os.environ["SQLITE_SYNCHRONOUS"] = args.synchronous
+
+    from sqlalchemy import update
+    from backend.database import SessionLocal
+    from backend.models import Product
+    from backend.seed import create_scale_data, create_seed_data
+    create_seed_data()
+    create_scale_data(products=args.products, users=0, orders=0)
+    db = SessionLocal()
+    db.execute(update(Product).values(stock=10_000_000))
+    db.commit()
+    product_ids = [product_id for (product_id,) in db.query(Product.id)]
+    db.close()
+
+    results = asyncio.run(run(args, product_ids))
+    print(f"\n{args.concurrency} clientes, {args.seconds:.0f}s por modo, synchronous={args.synchronous}")
+    for mode, stats in results.items():
+        print(
+            f"{mode:9} {stats['orders_per_second']:8.1f} pedidos/s  p50 {stats['p50_ms']:7.1f} ms  "
+            f"p95 {stats['p95_ms']:7.1f} ms  {stats['statuses']}"
+        )
+    print(f"ganho: {results['pipeline']['orders_per_second'] / results['atual']['orders_per_second']:.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Benchmark de concorrência leitura/escrita do SQLite: configuração padrão x WAL + pragmas.
+
+Uso: python -m backend.benchmarks.db_concurrency [--seconds 5] [--readers 8] [--writers 2]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+from sqlalchemy import create_engine, event, text
+from backend.database import configure_sqlite
+
+ROWS = 20000
+
+def build_engine(path: str, tuned: bool):
+    """Cria engine sobre um arquivo temporário, com ou sem os pragmas de produção"""
+    engine = create_engine(
+        f"sqlite:///{path}",
+        connect_args={"check_same_thread": False},
+        pool_size=32,
+        max_overflow=0
+    )
+    if tuned:
+        event.listen(engine, "connect", configure_sqlite)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY, stock INTEGER NOT NULL)"))
+        conn.execute(
+            text("INSERT INTO items (id, stock) VALUES (:id, :stock)"),
+            [{"id": i, "stock": 1000} for i in range(1, ROWS + 1)]
+        )
+    return engine
+
+def run_workload(engine, seconds: float, readers: int, writers: int) -> dict:
+    """Executa leitores e escritores em paralelo e mede vazão e latência"""
+    stop = time.perf_counter() + seconds
+    read_latencies, write_count, errors = [], [0], [0]
+    lock = threading.Lock()
+
+    def reader(seed: int):
+        latencies = []
+        i = seed
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            with engine.connect() as conn:
+                conn.execute(
+                    text("SELECT SUM(stock) FROM items WHERE id BETWEEN :a AND :b"),
+                    {"a": i % ROWS, "b": i % ROWS + 500}
+                ).scalar()
+            latencies.append(time.perf_counter() - start)
+            i += 997
+        with lock:
+            read_latencies.extend(latencies)
+
+    def writer(seed: int):
+        i = seed
+        while time.perf_counter() < stop:
+            try:
+                with engine.begin() as conn:
+                    conn.execute(
+                        text("UPDATE items SET stock = stock - 1 WHERE id = :id AND stock > 0"),
+                        {"id": i % ROWS + 1}
+                    )
+                with lock:
+                    write_count[0] += 1
+            except Exception:
+                with lock:
+                    errors[0] += 1
+            i += 7919
+
+    threads = [threading.Thread(target=reader, args=(n,)) for n in range(readers)]
+    threads += [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    read_latencies.sort()
+    p95 = read_latencies[int(len(read_latencies) * 0.95)] if read_latencies else 0.0
+    return {
+        "reads_per_s": len(read_latencies) / seconds,
+        "writes_per_s": write_count[0] / seconds,
+        "read_p50_ms": statistics.median(read_latencies) * 1000 if read_latencies else 0.0,
+        "read_p95_ms": p95 * 1000,
+        "write_errors": errors[0]
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, tuned in (("padrão", False), ("WAL + pragmas", True)):
+            engine = build_engine(os.path.join(tmp, f"bench_{int(tuned)}.db"), tuned)
+            results[label] = run_workload(engine, args.seconds, args.readers, args.writers)
+            engine.dispose()
+
+    print(f"{'configuração':<16}{'leituras/s':>12}{'escritas/s':>12}{'p50 leitura':>14}{'p95 leitura':>14}{'erros':>8}")
+    for label, r in results.items():
+        print(
+            f"{label:<16}{r['reads_per_s']:>12.0f}{r['writes_per_s']:>12.0f}"
+            f"{r['read_p50_ms']:>12.2f}ms{r['read_p95_ms']:>12.2f}ms{r['write_errors']:>8}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""Benchmark HTTP da API com cargas roteirizadas e percentis de latência por rota.
+
+Cargas: browse (navegação no catálogo), checkout (rajada de pedidos) e admin
+(edições de produtos em rajada, misturadas com leituras).
+
+Uso: python -m backend.benchmarks.http_load [--workload browse checkout admin]
+         [--seconds 10] [--concurrency 16] [--products 5000] [--server asgi|uvicorn]
+         [--save-baseline bench.json] [--baseline bench.json --threshold 0.2]
+
+Sempre usa um banco SQLite temporário (ignora DATABASE_URL): o benchmark cria
+produtos, usuário e pedidos e altera estoques.
+Sai com código 1 se alguma rota piorar mais que o limite em relação à baseline.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+# O banco precisa ser escolhido antes de importar o backend; nunca o da aplicação
+BENCH_DIR = tempfile.mkdtemp(prefix="loja-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{BENCH_DIR}/bench.db"
+
+import httpx
+from backend.app import app
+from backend.database import async_engine
+from backend.seed import create_scale_data, create_seed_data
+
+BENCH_EMAIL = "bench@example.com"
+BENCH_PASSWORD = "Bench123!"
+SEARCH_TERMS = ["caderno", "caneta", "mochila", "lápis", "azul", "escolar", "premium", "régua"]
+CATEGORIES = ["Cadernos", "Canetas", "Acessórios", "Papelaria", "Arte"]
+
+class Recorder:
+    """Guarda latências e status por rota"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    async def call(self, client: httpx.AsyncClient, route: str, method: str, url: str, **kwargs):
+        """Executa a requisição e registra a latência sob o nome da rota"""
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            status_class = f"{response.status_code // 100}xx"
+        except httpx.HTTPError:
+            response, status_class = None, "erro"
+        self.latencies[route].append(time.perf_counter() - started)
+        self.statuses[route][status_class] += 1
+        return response
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    """Percentil por posição mais próxima em uma lista já ordenada"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def summarize(recorder: Recorder, elapsed: float) -> dict:
+    """Vazão e p50/p95/p99 (ms) por rota"""
+    summary = {}
+    for route, latencies in sorted(recorder.latencies.items()):
+        latencies.sort()
+        summary[route] = {
+            "requests": len(latencies),
+            "rps": round(len(latencies) / elapsed, 1),
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+            "status": dict(recorder.statuses[route])
+        }
+    return summary
+
+# Cargas: cada passo escolhe uma operação e a executa uma vez
+
+async def browse_step(client, recorder, rng, context):
+    """Listagens, detalhes de produto, validação de cupom e alguns logins"""
+    roll = rng.random()
+    if roll < 0.55:
+        params = {"page_size": 12, "sort": rng.choice(["price", "name"]), "order": rng.choice(["asc", "desc"])}
+        if rng.random() < 0.4:
+            params["search"] = rng.choice(SEARCH_TERMS)
+        elif rng.random() < 0.4:
+            params["category"] = rng.choice(CATEGORIES)
+        else:
+            params["page"] = rng.randint(1, 20)
+        await recorder.call(client, "GET /products", "GET", "/products", params=params)
+    elif roll < 0.85:
+        product_id = rng.choice(context["product_ids"])
+        await recorder.call(client, "GET /products/{id}", "GET", f"/products/{product_id}")
+    elif roll < 0.97:
+        await recorder.call(client, "GET /coupons/{code}/validate", "GET", "/coupons/ALUNO10/validate")
+    else:
+        await recorder.call(
+            client, "POST /auth/login", "POST", "/auth/login",
+            json={"email": BENCH_EMAIL, "password": BENCH_PASSWORD}
+        )
+
+async def checkout_step(client, recorder, rng, context):
+    """Pedido sobre poucos produtos disputados por muitos clientes simultâneos"""
+    items = [
+        {"product_id": product_id, "quantity": rng.randint(1, 2)}
+        for product_id in rng.sample(context["hot_product_ids"], rng.randint(1, 3))
+    ]
+    payload = {"items": items, "coupon_code": "ALUNO10" if rng.random() < 0.3 else None}
+    await recorder.call(client, "POST /orders/confirm", "POST", "/orders/confirm", json=payload)
+
+async def admin_step(client, recorder, rng, context):
+    """Edições de preço/estoque misturadas com as leituras que elas invalidam"""
+    product_id = rng.choice(context["product_ids"])
+    if rng.random() < 0.5:
+        await recorder.call(
+            client, "PUT /products/{id}", "PUT", f"/products/{product_id}",
+            json={"price": f"{rng.randint(100, 9999) / 100:.2f}", "stock": rng.randint(10, 500)},
+            headers=context["auth"]
+        )
+    elif rng.random() < 0.5:
+        await recorder.call(client, "GET /products/{id}", "GET", f"/products/{product_id}")
+    else:
+        await recorder.call(client, "GET /products", "GET", "/products", params={"page_size": 12})
+
+WORKLOADS = {"browse": browse_step, "checkout": checkout_step, "admin": admin_step}
+
+async def prepare(client: httpx.AsyncClient) -> dict:
+    """Cria o usuário do benchmark e separa os produtos usados pelas cargas"""
+    await client.post("/auth/register", json={"name": "Benchmark", "email": BENCH_EMAIL, "password": BENCH_PASSWORD})
+    response = await client.post("/auth/login", json={"email": BENCH_EMAIL, "password": BENCH_PASSWORD})
+    response.raise_for_status()
+    auth = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    product_ids = []
+    cursor = None
+    while len(product_ids) < 2000:
+        params = {"page_size": 100, "sort": "price", "count": "none", "facets": False}
+        if cursor:
+            params["cursor"] = cursor
+        page = (await client.get("/products", params=params)).json()
+        product_ids += [product["id"] for product in page["data"]]
+        cursor = page["meta"]["next_cursor"]
+        if not cursor:
+            break
+
+    # Estoque alto nos produtos disputados para a rajada não esgotar logo no início
+    hot_product_ids = product_ids[:20]
+    for product_id in hot_product_ids:
+        await client.put(f"/products/{product_id}", json={"stock": 1_000_000}, headers=auth)
+    return {"auth": auth, "product_ids": product_ids, "hot_product_ids": hot_product_ids}
+
+async def run_workload(client, name: str, context: dict, seconds: float, concurrency: int, seed: int) -> dict:
+    """Executa a carga com N clientes simultâneos durante o tempo indicado"""
+    recorder = Recorder()
+    step = WORKLOADS[name]
+    deadline = time.perf_counter() + seconds
+
+    async def worker(worker_seed: int):
+        rng = random.Random(worker_seed)
+        while time.perf_counter() < deadline:
+            await step(client, recorder, rng, context)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(seed * 1000 + index) for index in range(concurrency)))
+    return summarize(recorder, time.perf_counter() - started)
+
+def start_uvicorn() -> tuple:
+    """Sobe o app em um uvicorn local (thread própria) e retorna (servidor, thread, URL)"""
+    import uvicorn
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread, f"http://127.0.0.1:{port}"
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Rotas cujo p95 subiu ou a vazão caiu além do limite"""
+    regressions = []
+    for workload, routes in results.items():
+        for route, current in routes.items():
+            previous = baseline.get(workload, {}).get(route)
+            if not previous:
+                continue
+            if current["p95_ms"] > previous["p95_ms"] * (1 + threshold):
+                regressions.append(f"{workload} {route}: p95 {previous['p95_ms']} -> {current['p95_ms']} ms")
+            if current["rps"] < previous["rps"] * (1 - threshold):
+                regressions.append(f"{workload} {route}: vazão {previous['rps']} -> {current['rps']} req/s")
+    return regressions
+
+def print_results(workload: str, summary: dict):
+    """Tabela com os resultados de uma carga"""
+    print(f"\n== {workload} ==")
+    print(f"{'rota':32} {'req':>7} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}  status")
+    for route, stats in summary.items():
+        print(
+            f"{route:32} {stats['requests']:>7} {stats['rps']:>9} {stats['p50_ms']:>9} "
+            f"{stats['p95_ms']:>9} {stats['p99_ms']:>9}  {stats['status']}"
+        )
+
+async def run(args) -> dict:
+    """Prepara os dados e executa as cargas pedidas, em sequência"""
+    server = thread = None
+    if args.server == "uvicorn":
+        server, thread, base_url = start_uvicorn()
+        transport = None
+    else:
+        base_url, transport = "http://bench", httpx.ASGITransport(app=app)
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    results = {}
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url=base_url, limits=limits, timeout=60) as client:
+            context = await prepare(client)
+            for workload in args.workload:
+                results[workload] = await run_workload(
+                    client, workload, context, args.seconds, args.concurrency, args.seed
+                )
+                print_results(workload, results[workload])
+    finally:
+        if server:
+            # O lifespan do app fecha o pool ao encerrar o uvicorn
+            server.should_exit = True
+            thread.join()
+        else:
+            await async_engine.dispose()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workload", nargs="+", choices=sorted(WORKLOADS), default=["browse", "checkout", "admin"])
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--products", type=int, default=5000, help="Produtos sintéticos além do seed")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--server", choices=["asgi", "uvicorn"], default="asgi")
+    parser.add_argument("--save-baseline", metavar="ARQUIVO", help="Salvar os resultados como baseline")
+    parser.add_argument("--baseline", metavar="ARQUIVO", help="Comparar com uma baseline salva")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Piora tolerada (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    create_seed_data()
+    if args.products:
+        create_scale_data(products=args.products, users=0, orders=0, seed=args.seed)
+    results = asyncio.run(run(args))
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as baseline_file:
+            json.dump(results, baseline_file, indent=2)
+        print(f"\nbaseline salva em {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.threshold)
+        if regressions:
+            print(f"\nregressões acima de {args.threshold:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nsem regressões acima de {args.threshold:.0%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Microbenchmark da serialização de uma página de 100 produtos: caminho antigo x serializer + orjson.
+
+Uso: python -m backend.benchmarks.serialization [--items 100] [--repeat 2000]
+"""
+import argparse
+import json
+import timeit
+from datetime import datetime
+from decimal import Decimal
+from pydantic import TypeAdapter
+from backend.models import Product
+from backend.schemas import ProductsListResponse
+from backend.serializers import serialize_decimal, serialize_product, dump_json
+
+def build_products(count: int) -> list:
+    """Produtos transientes com valores realistas (sem banco)"""
+    now = datetime.utcnow()
+    return [
+        Product(
+            id=i,
+            name=f"Caderno Espiral Universitário {i}",
+            description="Caderno espiral universitário com 200 folhas, capa dura, ideal para anotações de aula.",
+            price=Decimal("15.90") + i,
+            stock=50,
+            category="Cadernos",
+            sku=f"CAD-{i:06d}",
+            image_url="https://images.unsplash.com/photo-1544716278-ca5e3f4abd8c?w=800&h=600",
+            created_at=now,
+            updated_at=now
+        )
+        for i in range(1, count + 1)
+    ]
+
+def meta(count: int) -> dict:
+    return {"total": count, "page": 1, "page_size": count, "sort": "name", "order": "asc", "search": None}
+
+def before(products: list, adapter: TypeAdapter) -> bytes:
+    """Dicionário montado à mão + validação do response_model + json.dumps (caminho do FastAPI)"""
+    data = []
+    for product in products:
+        data.append({
+            "id": product.id,
+            "name": product.name,
+            "description": product.description,
+            "price": serialize_decimal(product.price),
+            "stock": product.stock,
+            "category": product.category,
+            "sku": product.sku,
+            "image_url": product.image_url,
+            "created_at": product.created_at,
+            "updated_at": product.updated_at
+        })
+    validated = adapter.validate_python({"data": data, "meta": meta(len(products))})
+    content = adapter.dump_python(validated, mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+def after(products: list) -> bytes:
+    """Serializer centralizado + orjson, sem segunda validação"""
+    return dump_json({"data": [serialize_product(product) for product in products], "meta": meta(len(products))})
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    products = build_products(args.items)
+    adapter = TypeAdapter(ProductsListResponse)
+    assert json.loads(before(products, adapter)) == json.loads(after(products))
+
+    before_s = min(timeit.repeat(lambda: before(products, adapter), number=args.repeat, repeat=3)) / args.repeat
+    after_s = min(timeit.repeat(lambda: after(products), number=args.repeat, repeat=3)) / args.repeat
+    print(f"página com {args.items} produtos")
+    print(f"antes  (dict manual + Pydantic + json): {before_s * 1e6:10.1f} µs")
+    print(f"depois (serializer + orjson):           {after_s * 1e6:10.1f} µs")
+    print(f"ganho: {before_s / after_s:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+class TTLCache:
+    """Cache LRU em memória com tamanho máximo e expiração por entrada"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Retorna o valor em cache ou None se ausente/expirado"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Armazena o valor, removendo o item menos usado se passar do limite"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        """Remove uma entrada do cache"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """Remove todas as entradas do cache"""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        """Contadores de uso do cache"""
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,123 @@
+import hashlib
+import os
+from typing import Optional
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from backend.cache import TTLCache
+from backend.database import SessionLocal, dialect_insert
+from backend.models import CatalogState, Product, ProductCounter
+
+# Cache de respostas do catálogo; a versão do catálogo faz parte de cada chave
+CATALOG_CACHE_SIZE = int(os.getenv("CATALOG_CACHE_SIZE", "512"))
+CATALOG_CACHE_TTL_SECONDS = float(os.getenv("CATALOG_CACHE_TTL_SECONDS", "300"))
+catalog_cache = TTLCache(maxsize=CATALOG_CACHE_SIZE, ttl=CATALOG_CACHE_TTL_SECONDS)
+
+# Cache-Control enviado junto com o ETag nas rotas de produtos
+CATALOG_HTTP_MAX_AGE = int(os.getenv("CATALOG_HTTP_MAX_AGE", "0"))
+CATALOG_CACHE_CONTROL = f"public, max-age={CATALOG_HTTP_MAX_AGE}, must-revalidate"
+
+# Contagens de buscas filtradas ficam em cache por pouco tempo
+COUNT_CACHE_TTL_SECONDS = float(os.getenv("COUNT_CACHE_TTL_SECONDS", "30"))
+count_cache = TTLCache(maxsize=CATALOG_CACHE_SIZE, ttl=COUNT_CACHE_TTL_SECONDS)
+
+# Limite de IDs por consulta em /products/batch
+PRODUCT_BATCH_MAX_IDS = int(os.getenv("PRODUCT_BATCH_MAX_IDS", "100"))
+
+CATALOG_STATE_ID = 1
+ALL_PRODUCTS_SCOPE = "*"
+
+def ensure_catalog_state():
+    """Cria a linha de versão do catálogo e os contadores de produtos se ainda não existirem"""
+    db = SessionLocal()
+    try:
+        if db.get(CatalogState, CATALOG_STATE_ID) is None:
+            db.add(CatalogState(id=CATALOG_STATE_ID, version=0))
+            db.commit()
+        if db.get(ProductCounter, ALL_PRODUCTS_SCOPE) is None:
+            rebuild_product_counters(db)
+            db.commit()
+    except IntegrityError:
+        # Outro worker criou a linha ao mesmo tempo
+        db.rollback()
+    finally:
+        db.close()
+
+async def get_catalog_version(db: AsyncSession) -> int:
+    """Lê a versão atual do catálogo (compartilhada entre workers via banco)"""
+    version = await db.scalar(select(CatalogState.version).where(CatalogState.id == CATALOG_STATE_ID))
+    return version or 0
+
+def bump_catalog_version(db: Session):
+    """Incrementa a versão do catálogo na transação atual"""
+    db.execute(
+        update(CatalogState)
+        .where(CatalogState.id == CATALOG_STATE_ID)
+        .values(version=CatalogState.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+def rebuild_product_counters(db: Session):
+    """Recalcula os contadores de produtos (total e por categoria) a partir da tabela products"""
+    db.execute(delete(ProductCounter))
+    rows = db.execute(select(Product.category, func.count()).group_by(Product.category)).all()
+    counters = [{"scope": category, "total": total} for category, total in rows]
+    counters.append({"scope": ALL_PRODUCTS_SCOPE, "total": sum(total for _, total in rows)})
+    db.execute(insert(ProductCounter), counters)
+
+def adjust_product_counters(db: Session, category: str, delta: int):
+    """Soma delta ao total geral e ao da categoria, na transação atual"""
+    apply_counter_deltas(db, {category: delta})
+
+def apply_counter_deltas(db: Session, deltas: dict):
+    """Aplica {categoria: delta} aos contadores por categoria e ao total geral"""
+    scopes = {ALL_PRODUCTS_SCOPE: sum(deltas.values()), **deltas}
+    for scope, delta in scopes.items():
+        if not delta:
+            continue
+        db.execute(
+            dialect_insert(db, ProductCounter)
+            .values(scope=scope, total=delta)
+            .on_conflict_do_update(
+                index_elements=[ProductCounter.scope],
+                set_={"total": ProductCounter.total + delta}
+            )
+        )
+
+async def get_product_count(db: AsyncSession, category: Optional[str] = None) -> int:
+    """Total de produtos (ou da categoria) lido dos contadores mantidos"""
+    total = await db.scalar(
+        select(ProductCounter.total).where(ProductCounter.scope == (category or ALL_PRODUCTS_SCOPE))
+    )
+    return total or 0
+
+async def get_category_counts(db: AsyncSession) -> list:
+    """(categoria, total) de todas as categorias com produtos, lidos dos contadores"""
+    rows = await db.execute(
+        select(ProductCounter.scope, ProductCounter.total)
+        .where(ProductCounter.scope != ALL_PRODUCTS_SCOPE, ProductCounter.total > 0)
+        .order_by(ProductCounter.scope)
+    )
+    return rows.all()
+
+def make_etag(version: int, key, products: list) -> str:
+    """ETag forte a partir da versão do catálogo, da consulta e de (id, updated_at) dos produtos"""
+    digest = hashlib.sha1(f"{version}|{key!r}".encode())
+    for product in products:
+        digest.update(f"|{product['id']}:{product['updated_at']}".encode())
+    return f'"{digest.hexdigest()}"'
+
+def combine_etags(version: int, key, etags: list) -> str:
+    """ETag de uma resposta montada a partir de entradas do cache que já têm ETag próprio"""
+    digest = hashlib.sha1(f"{version}|{key!r}".encode())
+    for etag in etags:
+        digest.update(f"|{etag}".encode())
+    return f'"{digest.hexdigest()}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Verifica se o cabeçalho If-None-Match contém o ETag atual"""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
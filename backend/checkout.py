@@ -0,0 +1,253 @@
+import asyncio
+import contextvars
+import os
+import random
+from sqlalchemy import case, insert, inspect, update
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from backend.catalog import bump_catalog_version
+from backend.database import AsyncSessionLocal
+from backend.idempotency import store_response
+from backend.models import Product, Order, OrderItem
+from backend.sales import record_sale
+
+# Configurações de retentativa quando o SQLite está bloqueado por outro escritor
+CHECKOUT_MAX_RETRIES = int(os.getenv("CHECKOUT_MAX_RETRIES", "5"))
+CHECKOUT_RETRY_BASE_MS = int(os.getenv("CHECKOUT_RETRY_BASE_MS", "20"))
+
+# Pipeline opcional com escritor único (group commit) para rajadas de checkout
+CHECKOUT_PIPELINE = os.getenv("CHECKOUT_PIPELINE", "false").lower() in ("1", "true", "yes")
+CHECKOUT_BATCH_MAX_SIZE = int(os.getenv("CHECKOUT_BATCH_MAX_SIZE", "64"))
+CHECKOUT_BATCH_MAX_WAIT_MS = float(os.getenv("CHECKOUT_BATCH_MAX_WAIT_MS", "2"))
+
+def is_database_locked(error: OperationalError) -> bool:
+    """Verifica se o erro é de banco bloqueado (SQLite)"""
+    return "database is locked" in str(error.orig).lower()
+
+def retry_delay(attempt: int) -> float:
+    """Backoff exponencial com jitter, em segundos"""
+    base = CHECKOUT_RETRY_BASE_MS / 1000 * (2 ** attempt)
+    return base * random.uniform(0.5, 1.5)
+
+def reserve_stock(db: Session, quantities: dict):
+    """Decrementa o estoque dos produtos somente onde houver saldo suficiente.
+
+    Um único UPDATE condicional (CASE por id) com RETURNING cobre todas as
+    linhas. Retorna ({id: (estoque, updated_at)} das linhas reservadas,
+    IDs das linhas que perderam a disputa por estoque).
+    """
+    quantity = case(quantities, value=Product.id)
+    result = db.execute(
+        update(Product)
+        .where(Product.id.in_(quantities.keys()), Product.stock >= quantity)
+        .values(stock=Product.stock - quantity)
+        .returning(Product.id, Product.stock, Product.updated_at)
+        .execution_options(synchronize_session=False)
+    )
+    reserved = {row.id: (row.stock, row.updated_at) for row in result}
+    lost_ids = [product_id for product_id in quantities if product_id not in reserved]
+    return reserved, lost_ids
+
+def insert_order(db: Session, order: Order, order_items_data: list) -> dict:
+    """Grava pedido, itens e consolidados de vendas; retorna {product_id: id do item}"""
+    db.add(order)
+    db.flush()
+    # Todos os itens em um único INSERT multi-linha; product_id é único no pedido
+    rows = db.execute(
+        insert(OrderItem)
+        .values([
+            {
+                "order_id": order.id,
+                "product_id": item_data["product_id"],
+                "quantity": item_data["quantity"],
+                "unit_price": item_data["unit_price"],
+                "line_total": item_data["line_total"]
+            }
+            for item_data in order_items_data
+        ])
+        .returning(OrderItem.id, OrderItem.product_id)
+    ).all()
+    # Consolidados de vendas na mesma transação do pedido
+    record_sale(db, order, order_items_data)
+    return {row.product_id: row.id for row in rows}
+
+def build_order_items(db: Session, order: Order, order_items_data: list, reserved: dict, item_ids: dict) -> list:
+    """Monta os itens em memória, sem recarregar pedido e produtos"""
+    order_items = []
+    for item_data in order_items_data:
+        product = item_data["product"]
+        if inspect(product).expired_attributes:
+            # Só ocorre após retentativa (rollback expira os objetos)
+            db.refresh(product)
+        stock, updated_at = reserved[item_data["product_id"]]
+        set_committed_value(product, "stock", stock)
+        set_committed_value(product, "updated_at", updated_at)
+        order_item = OrderItem(
+            id=item_ids[item_data["product_id"]],
+            order_id=order.id,
+            product_id=item_data["product_id"],
+            quantity=item_data["quantity"],
+            unit_price=item_data["unit_price"],
+            line_total=item_data["line_total"]
+        )
+        set_committed_value(order_item, "product", product)
+        order_items.append(order_item)
+    return order_items
+
+def place_order(db: Session, order: Order, order_items_data: list, idempotency: tuple = None):
+    """Reserva estoque e grava pedido e itens em uma única transação.
+
+    Retorna (itens do pedido, IDs sem estoque). Em caso de estoque
+    insuficiente desfaz a transação e retorna ([], IDs dos produtos
+    afetados). Os itens retornados já trazem o produto atualizado, para
+    montar a resposta sem novas consultas. Com idempotency = (chave, hash
+    do corpo) a resposta é gravada junto com o pedido.
+    """
+    quantities = {item_data["product_id"]: item_data["quantity"] for item_data in order_items_data}
+    reserved, lost_ids = reserve_stock(db, quantities)
+    if lost_ids:
+        db.rollback()
+        return [], lost_ids
+
+    item_ids = insert_order(db, order, order_items_data)
+    order_items = build_order_items(db, order, order_items_data, reserved, item_ids)
+    if idempotency:
+        store_response(db, *idempotency, order, order_items)
+    # Estoque mudou: invalidar respostas do catálogo em cache
+    bump_catalog_version(db)
+    db.commit()
+    return order_items, []
+
+def place_orders(db: Session, jobs: list) -> list:
+    """Grava vários pedidos em uma única transação (group commit).
+
+    Cada pedido roda em um SAVEPOINT próprio: falta de estoque ou erro de
+    integridade desfaz só aquele pedido. Retorna, na ordem de jobs,
+    (pedido, itens, IDs sem estoque, erro) para cada (valores do pedido,
+    itens, idempotência).
+    """
+    if db.get_bind().dialect.name == "sqlite":
+        # O pysqlite só abre a transação no primeiro INSERT/UPDATE; sem BEGIN
+        # explícito cada SAVEPOINT viraria uma transação própria (um commit
+        # por pedido). IMMEDIATE já reserva a escrita para o lote inteiro.
+        db.connection().exec_driver_sql("BEGIN IMMEDIATE")
+
+    results = []
+    for order_values, order_items_data, idempotency in jobs:
+        order = Order(**order_values)
+        quantities = {item_data["product_id"]: item_data["quantity"] for item_data in order_items_data}
+        savepoint = db.begin_nested()
+        try:
+            reserved, lost_ids = reserve_stock(db, quantities)
+            if lost_ids:
+                savepoint.rollback()
+                results.append((order, [], lost_ids, None))
+                continue
+            item_ids = insert_order(db, order, order_items_data)
+            order_items = build_order_items(db, order, order_items_data, reserved, item_ids)
+            if idempotency:
+                store_response(db, *idempotency, order, order_items)
+            savepoint.commit()
+            results.append((order, order_items, [], None))
+        except IntegrityError as e:
+            savepoint.rollback()
+            results.append((order, [], [], e))
+
+    # Estoque só mudou se algum pedido foi gravado: só então invalidar o cache
+    if any(order_items for _, order_items, _, _ in results):
+        bump_catalog_version(db)
+    db.commit()
+    return results
+
+class CheckoutPipeline:
+    """Escritor único de pedidos: agrupa as confirmações simultâneas em uma transação.
+
+    Cada chamador de submit() recebe o próprio resultado ou erro. Um lote
+    fecha ao atingir CHECKOUT_BATCH_MAX_SIZE pedidos ou após
+    CHECKOUT_BATCH_MAX_WAIT_MS milissegundos.
+    """
+
+    def __init__(self, enabled: bool, max_batch_size: int, max_wait_ms: float):
+        self.enabled = enabled
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.queue = None
+        self.task = None
+
+    def start(self):
+        """Inicia o escritor no loop de eventos atual"""
+        self.queue = asyncio.Queue()
+        # Contexto vazio: a tarefa não herda as variáveis de contexto da requisição
+        # que a iniciou (ex.: o perfil de consultas do profiler)
+        self.task = asyncio.create_task(self.run(), context=contextvars.Context())
+
+    async def stop(self):
+        """Encerra o escritor; pedidos ainda na fila recebem erro"""
+        if self.task is None:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        while not self.queue.empty():
+            future = self.queue.get_nowait()[-1]
+            if not future.done():
+                future.set_exception(RuntimeError("Pipeline de checkout encerrado"))
+        self.queue = self.task = None
+
+    async def submit(self, order_values: dict, order_items_data: list, idempotency: tuple = None):
+        """Enfileira o pedido e aguarda (pedido, itens, IDs sem estoque)"""
+        if self.task is None or self.task.done():
+            self.start()
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((order_values, order_items_data, idempotency, future))
+        return await future
+
+    async def run(self):
+        """Laço do escritor: forma lotes com o que está na fila e os grava em sequência"""
+        while True:
+            batch = [await self.queue.get()]
+            # Espera curta para juntar os pedidos que chegam em rajada
+            if self.max_wait > 0 and self.queue.qsize() < self.max_batch_size - 1:
+                await asyncio.sleep(self.max_wait)
+            while len(batch) < self.max_batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            batch = [job for job in batch if not job[-1].done()]
+            if batch:
+                await self.write_batch(batch)
+
+    async def write_batch(self, batch: list):
+        """Grava o lote, retentando enquanto o SQLite estiver bloqueado por outro processo"""
+        jobs = [job[:-1] for job in batch]
+        attempt = 0
+        while True:
+            try:
+                async with AsyncSessionLocal() as db:
+                    results = await db.run_sync(place_orders, jobs)
+                break
+            except OperationalError as e:
+                if is_database_locked(e) and attempt < CHECKOUT_MAX_RETRIES:
+                    await asyncio.sleep(retry_delay(attempt))
+                    attempt += 1
+                    continue
+                for *_, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            except Exception as e:
+                for *_, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+        for (*_, future), (order, order_items, lost_ids, error) in zip(batch, results):
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result((order, order_items, lost_ids))
+
+checkout_pipeline = CheckoutPipeline(CHECKOUT_PIPELINE, CHECKOUT_BATCH_MAX_SIZE, CHECKOUT_BATCH_MAX_WAIT_MS)
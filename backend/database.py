@@ -1,20 +1,120 @@
 import os
-from sqlalchemy import create_engine
+import time
+from sqlalchemy import create_engine, event
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from backend.metrics import observe_pool_wait, register_pool
+from backend.profiler import instrument_engine
 
-# URL do banco SQLite
-SQLALCHEMY_DATABASE_URL = "sqlite:///./app.db"
+# URL do banco (SQLite por padrão, Postgres via DATABASE_URL)
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./app.db")
+if SQLALCHEMY_DATABASE_URL.startswith("postgres://"):
+    SQLALCHEMY_DATABASE_URL = "postgresql://" + SQLALCHEMY_DATABASE_URL.split("://", 1)[1]
 
-# Configuração do engine
+# Pragmas do SQLite (WAL permite leitores simultâneos ao escritor)
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))  # negativo = KiB (64 MiB)
+
+# Pool de conexões
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+def to_async_url(url: str) -> str:
+    """Converte a URL síncrona para o driver assíncrono equivalente"""
+    if url.startswith("sqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    return url
+
+ASYNC_DATABASE_URL = to_async_url(SQLALCHEMY_DATABASE_URL)
+IS_SQLITE = SQLALCHEMY_DATABASE_URL.startswith("sqlite")
+IS_SQLITE_MEMORY = IS_SQLITE and (":memory:" in SQLALCHEMY_DATABASE_URL or SQLALCHEMY_DATABASE_URL.rstrip("/") == "sqlite:")
+
+class MeteredPoolMixin:
+    """Mede quanto tempo cada checkout espera por uma conexão"""
+    metrics_name = "sync"
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            observe_pool_wait(self.metrics_name, time.perf_counter() - started)
+
+class MeteredQueuePool(MeteredPoolMixin, QueuePool):
+    metrics_name = "sync"
+
+class MeteredAsyncQueuePool(MeteredPoolMixin, AsyncAdaptedQueuePool):
+    metrics_name = "async"
+
+def engine_options(is_async: bool = False) -> dict:
+    """Opções de pool comuns aos engines síncrono e assíncrono"""
+    if IS_SQLITE_MEMORY:
+        # Banco em memória usa pool próprio do SQLAlchemy, sem overflow
+        return {}
+    options = {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+    }
+    if not IS_SQLITE:
+        options["pool_pre_ping"] = True
+    # Pools com medição de espera; no aiosqlite também evita o NullPool padrão
+    # (uma conexão nova por sessão)
+    options["poolclass"] = MeteredAsyncQueuePool if is_async else MeteredQueuePool
+    return options
+
+def configure_sqlite(dbapi_connection, connection_record):
+    """Aplica os pragmas de desempenho a cada nova conexão SQLite"""
+    cursor = dbapi_connection.cursor()
+    if not IS_SQLITE_MEMORY:
+        cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+    cursor.close()
+
+# Configuração do engine síncrono (seed, criação de tabelas e scripts)
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False}  # Necessário para SQLite
+    connect_args={"check_same_thread": False} if IS_SQLITE else {},  # Necessário para SQLite
+    **engine_options()
 )
 
+# Configuração do engine assíncrono (rotas da API)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(is_async=True))
+
+# Contagem/tempo de consultas por requisição e log de consultas lentas
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+
+register_pool("sync", lambda: engine.pool)
+register_pool("async", lambda: async_engine.pool)
+
+if IS_SQLITE:
+    event.listen(engine, "connect", configure_sqlite)
+    event.listen(async_engine.sync_engine, "connect", configure_sqlite)
+
 # Session local
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Session assíncrona (sem expirar objetos no commit para evitar lazy loads)
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
 # Base declarativa
 Base = declarative_base()
 
@@ -26,6 +126,21 @@ def get_db():
     finally:
         db.close()
 
+# Dependência para obter a sessão assíncrona do banco
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def dialect_insert(db: Session, table):
+    """INSERT do dialeto em uso (SQLite ou Postgres), com suporte a ON CONFLICT"""
+    if db.get_bind().dialect.name == "postgresql":
+        return postgresql_insert(table)
+    return sqlite_insert(table)
+
 # Função para criar as tabelas
 def create_tables():
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    Base.metadata.create_all(bind=engine)
+    # create_all não adiciona índices novos em tabelas já existentes
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
@@ -0,0 +1,117 @@
+import csv
+import io
+import os
+from collections import defaultdict
+from datetime import datetime
+from typing import AsyncIterator, Optional
+import orjson
+from sqlalchemy import select, tuple_
+from backend.database import AsyncSessionLocal
+from backend.models import Order, OrderItem, Product
+from backend.serializers import serialize_decimal
+
+# Pedidos lidos do cursor por vez (e itens carregados por lote)
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+# Uma linha por item no CSV, com os dados do pedido repetidos
+CSV_COLUMNS = (
+    "order_id", "created_at", "user_id", "subtotal", "discount_amount", "total_final",
+    "item_id", "product_id", "sku", "product_name", "quantity", "unit_price", "line_total"
+)
+
+def orders_export_query(date_from: Optional[datetime], date_to: Optional[datetime], resume_after=None):
+    """Pedidos do período em ordem de (created_at, id), a partir do ponto de retomada"""
+    query = select(
+        Order.id, Order.user_id, Order.subtotal, Order.discount_amount, Order.total_final, Order.created_at
+    )
+    if date_from:
+        query = query.where(Order.created_at >= date_from)
+    if date_to:
+        query = query.where(Order.created_at < date_to)
+    if resume_after:
+        query = query.where(tuple_(Order.created_at, Order.id) > tuple_(*resume_after))
+    return query.order_by(Order.created_at, Order.id)
+
+async def load_items(db, order_ids: list) -> dict:
+    """Itens de um lote de pedidos em uma única consulta, agrupados por pedido"""
+    rows = await db.execute(
+        select(
+            OrderItem.order_id, OrderItem.id, OrderItem.product_id, Product.sku, Product.name,
+            OrderItem.quantity, OrderItem.unit_price, OrderItem.line_total
+        )
+        .outerjoin(Product, Product.id == OrderItem.product_id)
+        .where(OrderItem.order_id.in_(order_ids))
+        .order_by(OrderItem.order_id, OrderItem.id)
+    )
+    items = defaultdict(list)
+    for row in rows:
+        items[row.order_id].append(row)
+    return items
+
+def encode_ndjson(orders: list, items: dict) -> bytes:
+    """Um objeto JSON por pedido, com os itens embutidos"""
+    return b"".join(
+        orjson.dumps({
+            "id": order.id,
+            "user_id": order.user_id,
+            "subtotal": serialize_decimal(order.subtotal),
+            "discount_amount": serialize_decimal(order.discount_amount),
+            "total_final": serialize_decimal(order.total_final),
+            "created_at": order.created_at,
+            "items": [
+                {
+                    "id": item.id,
+                    "product_id": item.product_id,
+                    "sku": item.sku,
+                    "product_name": item.name,
+                    "quantity": item.quantity,
+                    "unit_price": serialize_decimal(item.unit_price),
+                    "line_total": serialize_decimal(item.line_total)
+                }
+                for item in items.get(order.id, [])
+            ]
+        }) + b"\n"
+        for order in orders
+    )
+
+def encode_csv(orders: list, items: dict) -> bytes:
+    """Uma linha CSV por item de pedido"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for order in orders:
+        order_columns = (
+            order.id, order.created_at.isoformat(), order.user_id,
+            serialize_decimal(order.subtotal), serialize_decimal(order.discount_amount),
+            serialize_decimal(order.total_final)
+        )
+        for item in items.get(order.id, []):
+            writer.writerow(order_columns + (
+                item.id, item.product_id, item.sku, item.name, item.quantity,
+                serialize_decimal(item.unit_price), serialize_decimal(item.line_total)
+            ))
+    return buffer.getvalue().encode()
+
+async def export_orders(
+    export_format: str,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    resume_after=None
+) -> AsyncIterator[bytes]:
+    """Gera o arquivo de exportação em blocos, lendo os pedidos com cursor (yield_per).
+
+    Usa uma sessão própria, que vive enquanto a resposta estiver sendo enviada.
+    """
+    encode = encode_csv if export_format == "csv" else encode_ndjson
+    if export_format == "csv":
+        header = io.StringIO()
+        csv.writer(header).writerow(CSV_COLUMNS)
+        yield header.getvalue().encode()
+
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(
+            orders_export_query(date_from, date_to, resume_after)
+            .execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        async for orders in result.partitions():
+            items = await load_items(db, [order.id for order in orders])
+            yield encode(orders, items)
@@ -0,0 +1,76 @@
+import asyncio
+import hashlib
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import delete, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from backend.models import IdempotencyKey, Order
+from backend.serializers import dump_json, serialize_order
+
+# Por quanto tempo uma chave repete a resposta original
+IDEMPOTENCY_TTL_HOURS = float(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+# Intervalo mínimo entre duas limpezas das chaves expiradas
+IDEMPOTENCY_PURGE_INTERVAL_SECONDS = float(os.getenv("IDEMPOTENCY_PURGE_INTERVAL_SECONDS", "300"))
+
+# Tentativas em andamento neste processo: {chave: future resolvido ao terminar}
+in_flight = {}
+last_purge = [0.0]
+
+def request_fingerprint(payload: dict) -> str:
+    """Hash do corpo do pedido, para recusar a mesma chave com outro conteúdo"""
+    return hashlib.sha256(dump_json(payload)).hexdigest()
+
+def ttl_cutoff() -> datetime:
+    """Chaves criadas antes deste instante estão expiradas"""
+    return datetime.utcnow() - timedelta(hours=IDEMPOTENCY_TTL_HOURS)
+
+async def acquire_key(key: str):
+    """Aguarda a tentativa em andamento com a mesma chave e registra a atual"""
+    while (running := in_flight.get(key)) is not None:
+        await asyncio.shield(running)
+    in_flight[key] = asyncio.get_running_loop().create_future()
+
+def release_key(key: str):
+    """Libera a chave e acorda as requisições que aguardavam por ela"""
+    running = in_flight.pop(key, None)
+    if running is not None and not running.done():
+        running.set_result(None)
+
+async def find_stored_response(db: AsyncSession, key: str) -> Optional[IdempotencyKey]:
+    """Resposta gravada para a chave, se ainda dentro do TTL"""
+    return await db.scalar(
+        select(IdempotencyKey).where(IdempotencyKey.key == key, IdempotencyKey.created_at >= ttl_cutoff())
+    )
+
+def store_response(db: Session, key: str, request_hash: str, order: Order, order_items: list):
+    """Grava a chave e o corpo da resposta na transação do pedido"""
+    # Uma chave expirada ainda não removida é substituída pela nova tentativa
+    db.execute(delete(IdempotencyKey).where(IdempotencyKey.key == key, IdempotencyKey.created_at < ttl_cutoff()))
+    db.add(IdempotencyKey(
+        key=key,
+        request_hash=request_hash,
+        order_id=order.id,
+        status_code=201,
+        response=dump_json(serialize_order(order, order_items)),
+        created_at=datetime.utcnow()
+    ))
+    db.flush()
+
+async def purge_expired_keys(db: AsyncSession) -> int:
+    """Remove as chaves expiradas, no máximo uma vez por intervalo; retorna quantas"""
+    now = time.monotonic()
+    if now - last_purge[0] < IDEMPOTENCY_PURGE_INTERVAL_SECONDS:
+        return 0
+    last_purge[0] = now
+    try:
+        result = await db.execute(delete(IdempotencyKey).where(IdempotencyKey.created_at < ttl_cutoff()))
+        await db.commit()
+    except OperationalError:
+        # Limpeza é oportunista: banco ocupado fica para a próxima vez
+        await db.rollback()
+        return 0
+    return result.rowcount
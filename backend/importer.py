@@ -0,0 +1,197 @@
+import codecs
+import csv
+import os
+from collections import defaultdict
+from datetime import datetime
+from typing import AsyncIterator, Optional
+import orjson
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from backend.catalog import apply_counter_deltas, bump_catalog_version
+from backend.database import dialect_insert
+from backend.models import Product
+from backend.schemas import ProductCreate
+from backend.search import fts_enabled, index_products
+
+# Linhas gravadas por lote (um executemany + um commit por lote)
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+# Limite de erros detalhados no relatório (os demais só entram na contagem)
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "1000"))
+
+PRODUCT_FIELDS = ("name", "description", "price", "stock", "category", "sku", "image_url")
+
+def detect_import_format(content_type: Optional[str]) -> Optional[str]:
+    """Descobre o formato (csv ou ndjson) pelo Content-Type do upload"""
+    content_type = (content_type or "").lower()
+    if "csv" in content_type:
+        return "csv"
+    if "ndjson" in content_type or "jsonl" in content_type or "json-seq" in content_type:
+        return "ndjson"
+    return None
+
+async def iter_lines(stream: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Quebra o corpo recebido em linhas de texto, sem carregá-lo inteiro em memória"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    buffer = ""
+    async for chunk in stream:
+        buffer += decoder.decode(chunk)
+        lines = buffer.split("\n")
+        buffer = lines.pop()
+        for line in lines:
+            yield line.rstrip("\r")
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer.rstrip("\r")
+
+async def iter_csv_rows(lines: AsyncIterator[str]):
+    """(linha, dados, erro) de cada registro CSV; a primeira linha é o cabeçalho"""
+    header = None
+    pending = ""
+    start_line = line_number = 0
+    async for line in lines:
+        line_number += 1
+        if not pending:
+            start_line = line_number
+        pending = f"{pending}\n{line}" if pending else line
+        # Aspas em número ímpar: campo com quebra de linha continua na próxima linha
+        if pending.count('"') % 2:
+            continue
+        record, pending = pending, ""
+        if not record.strip():
+            continue
+        values = next(csv.reader([record]))
+        if header is None:
+            header = [value.strip() for value in values]
+            continue
+        if len(values) != len(header):
+            yield start_line, None, "Número de colunas diferente do cabeçalho"
+            continue
+        yield start_line, {key: value or None for key, value in zip(header, values)}, None
+    if pending:
+        yield start_line, None, "Aspas não fechadas no fim do arquivo"
+
+async def iter_ndjson_rows(lines: AsyncIterator[str]):
+    """(linha, dados, erro) de cada objeto NDJSON"""
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            data = orjson.loads(line)
+        except orjson.JSONDecodeError:
+            yield line_number, None, "JSON inválido"
+            continue
+        if not isinstance(data, dict):
+            yield line_number, None, "Linha não é um objeto JSON"
+            continue
+        yield line_number, data, None
+
+def validation_messages(error: ValidationError) -> list:
+    """Mensagens de erro do Pydantic no formato 'campo: mensagem'"""
+    return [
+        f"{'.'.join(str(part) for part in detail['loc'])}: {detail['msg']}"
+        for detail in error.errors()
+    ]
+
+def upsert_products(db: Session, products: list):
+    """Grava um lote de produtos com upsert por SKU, na transação atual.
+
+    Mantém índice de busca, contadores e versão do catálogo em sincronia.
+    Retorna (produtos criados, produtos atualizados).
+    """
+    skus = [product["sku"] for product in products]
+    existing = dict(db.execute(select(Product.sku, Product.category).where(Product.sku.in_(skus))).all())
+
+    now = datetime.utcnow()
+    statement = dialect_insert(db, Product)
+    statement = statement.on_conflict_do_update(
+        index_elements=[Product.sku],
+        set_={
+            **{field: statement.excluded[field] for field in PRODUCT_FIELDS if field != "sku"},
+            "updated_at": statement.excluded.updated_at
+        }
+    )
+    db.execute(statement, [{**product, "created_at": now, "updated_at": now} for product in products])
+
+    if fts_enabled():
+        rows = db.execute(
+            select(Product.id, Product.name, Product.description, Product.category, Product.sku)
+            .where(Product.sku.in_(skus))
+        )
+        index_products(db, [row._asdict() for row in rows])
+
+    # Novos produtos entram nos contadores; atualizados só mudam se trocarem de categoria
+    deltas = defaultdict(int)
+    for product in products:
+        previous_category = existing.get(product["sku"])
+        if previous_category != product["category"]:
+            if previous_category is not None:
+                deltas[previous_category] -= 1
+            deltas[product["category"]] += 1
+    apply_counter_deltas(db, deltas)
+    bump_catalog_version(db)
+
+    created = len(products) - len(existing)
+    return created, len(existing)
+
+async def import_products(db: AsyncSession, stream: AsyncIterator[bytes], import_format: str) -> dict:
+    """Lê o upload em streaming, valida cada linha e grava em lotes.
+
+    Retorna o relatório da importação com os erros por linha.
+    """
+    report = {"processed": 0, "created": 0, "updated": 0, "failed": 0, "errors": [], "errors_truncated": False}
+
+    def add_error(line: int, sku: Optional[str], messages: list):
+        report["failed"] += 1
+        if len(report["errors"]) < IMPORT_MAX_ERRORS:
+            report["errors"].append({"line": line, "sku": sku, "errors": messages})
+        else:
+            report["errors_truncated"] = True
+
+    # Lote atual por SKU (linha repetida no mesmo lote sobrescreve a anterior)
+    chunk = {}
+    replaced = 0
+
+    async def flush():
+        nonlocal replaced
+        if not chunk:
+            return
+        try:
+            created, updated = await db.run_sync(upsert_products, [product for _, product in chunk.values()])
+            await db.commit()
+            report["created"] += created
+            report["updated"] += updated + replaced
+        except SQLAlchemyError:
+            await db.rollback()
+            for line, product in chunk.values():
+                add_error(line, product["sku"], ["Erro ao gravar o lote no banco de dados"])
+        chunk.clear()
+        replaced = 0
+
+    lines = iter_lines(stream)
+    rows = iter_csv_rows(lines) if import_format == "csv" else iter_ndjson_rows(lines)
+    async for line, data, error in rows:
+        report["processed"] += 1
+        if error:
+            add_error(line, None, [error])
+            continue
+        sku = data.get("sku")
+        try:
+            product = ProductCreate(**data)
+        except ValidationError as e:
+            add_error(line, sku if isinstance(sku, str) else None, validation_messages(e))
+            continue
+        if not product.sku:
+            add_error(line, None, ["sku: SKU obrigatório na importação"])
+            continue
+        if product.sku in chunk:
+            replaced += 1
+        chunk[product.sku] = (line, product.dict(include=set(PRODUCT_FIELDS)))
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            await flush()
+    await flush()
+    return report
@@ -0,0 +1,179 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable
+
+# Métricas ligadas por padrão; /metrics some quando desligadas
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Limites (em segundos) dos buckets dos histogramas de latência
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+POOL_WAIT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+# Rótulo das requisições que não casaram com nenhuma rota (evita um rótulo por URL)
+UNMATCHED_ROUTE = "unmatched"
+
+class Histogram:
+    """Histograma com buckets fixos (contagens não acumuladas; acumuladas só na exportação)"""
+    __slots__ = ("buckets", "counts", "total", "count")
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # último = +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        """Conta um valor no bucket correspondente"""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def render(self, name: str, labels: str) -> list:
+        """Linhas _bucket/_sum/_count no formato texto do Prometheus"""
+        lines = []
+        cumulative = 0
+        separator = "," if labels else ""
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels}{separator}le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels}{separator}le="+Inf"}} {self.count}')
+        lines.append(f"{name}_sum{{{labels}}} {self.total}")
+        lines.append(f"{name}_count{{{labels}}} {self.count}")
+        return lines
+
+class RouteSeries:
+    """Contagem por classe de status e latência de uma rota"""
+    __slots__ = ("statuses", "latency")
+
+    def __init__(self):
+        self.statuses = [0] * 6  # índice = primeiro dígito do status (1xx a 5xx)
+        self.latency = Histogram(LATENCY_BUCKETS)
+
+# Estado das métricas HTTP. Só é alterado no loop de eventos, portanto sem lock.
+request_series = {}
+requests_in_flight = [0]
+
+# Espera por conexões do pool (alterada em threads diferentes, com lock)
+pool_wait = {}
+pool_wait_lock = threading.Lock()
+pool_sources = {}
+
+# Caches em memória com contadores de acerto/erro (TTLCache)
+cache_sources = {}
+
+def observe_request(method: str, route: str, status_code: int, seconds: float):
+    """Registra uma requisição concluída"""
+    series = request_series.get((method, route))
+    if series is None:
+        series = request_series[(method, route)] = RouteSeries()
+    series.statuses[status_code // 100] += 1
+    series.latency.observe(seconds)
+
+def observe_pool_wait(pool: str, seconds: float):
+    """Registra o tempo de espera por uma conexão do pool"""
+    with pool_wait_lock:
+        histogram = pool_wait.get(pool)
+        if histogram is None:
+            histogram = pool_wait[pool] = Histogram(POOL_WAIT_BUCKETS)
+        histogram.observe(seconds)
+
+def register_pool(name: str, get_pool: Callable):
+    """Registra um pool para os gauges de conexões (função, pois dispose() recria o pool)"""
+    pool_sources[name] = get_pool
+
+def register_cache(name: str, cache):
+    """Registra um cache para exportar acertos, erros e tamanho"""
+    cache_sources[name] = cache
+
+class MetricsMiddleware:
+    """Middleware ASGI que mede cada requisição HTTP pelo template da rota"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500  # se nenhuma resposta for enviada, conta como erro
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        requests_in_flight[0] += 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            requests_in_flight[0] -= 1
+            # O roteador do FastAPI deixa a rota encontrada no scope
+            route = scope.get("route")
+            observe_request(
+                scope["method"],
+                route.path_format if route is not None else UNMATCHED_ROUTE,
+                status_code,
+                elapsed
+            )
+
+def render_metrics() -> str:
+    """Todas as métricas no formato texto do Prometheus"""
+    lines = [
+        "# HELP http_requests_total Requisições HTTP por rota, método e classe de status",
+        "# TYPE http_requests_total counter"
+    ]
+    series_items = sorted(request_series.items())
+    for (method, route), series in series_items:
+        for status_class, count in enumerate(series.statuses):
+            if count:
+                lines.append(
+                    f'http_requests_total{{method="{method}",route="{route}",status="{status_class}xx"}} {count}'
+                )
+
+    lines += [
+        "# HELP http_request_duration_seconds Latência das requisições HTTP",
+        "# TYPE http_request_duration_seconds histogram"
+    ]
+    for (method, route), series in series_items:
+        lines += series.latency.render("http_request_duration_seconds", f'method="{method}",route="{route}"')
+
+    lines += [
+        "# HELP http_requests_in_flight Requisições HTTP em andamento",
+        "# TYPE http_requests_in_flight gauge",
+        f"http_requests_in_flight {requests_in_flight[0]}",
+        "# HELP db_pool_checkout_wait_seconds Espera para obter uma conexão do pool (inclui abertura de conexões novas)",
+        "# TYPE db_pool_checkout_wait_seconds histogram"
+    ]
+    with pool_wait_lock:
+        for pool, histogram in sorted(pool_wait.items()):
+            lines += histogram.render("db_pool_checkout_wait_seconds", f'pool="{pool}"')
+
+    gauges = (
+        ("db_pool_size", "Conexões mantidas pelo pool", "size"),
+        ("db_pool_checked_out", "Conexões em uso", "checkedout"),
+        ("db_pool_overflow", "Conexões extras além de pool_size (negativo = vagas ainda não abertas)", "overflow")
+    )
+    for name, help_text, method in gauges:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+        for pool_name, get_pool in sorted(pool_sources.items()):
+            pool = get_pool()
+            if hasattr(pool, method):
+                lines.append(f'{name}{{pool="{pool_name}"}} {getattr(pool, method)()}')
+
+    cache_metrics = (
+        ("cache_hits_total", "Leituras atendidas pelo cache", "counter", "hits"),
+        ("cache_misses_total", "Leituras ausentes ou expiradas no cache", "counter", "misses"),
+        ("cache_entries", "Entradas mantidas no cache", "gauge", "size")
+    )
+    cache_stats = {name: cache.stats() for name, cache in sorted(cache_sources.items())}
+    for name, help_text, metric_type, key in cache_metrics:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+        for cache_name, stats in cache_stats.items():
+            lines.append(f'{name}{{cache="{cache_name}"}} {stats[key]}')
+    return "\n".join(lines) + "\n"
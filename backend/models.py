@@ -1,6 +1,6 @@
 from datetime import datetime
 from decimal import Decimal
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Index, DECIMAL, Text
+from sqlalchemy import Column, Integer, String, Boolean, Date, DateTime, ForeignKey, Index, DECIMAL, LargeBinary, Text
 from sqlalchemy.orm import relationship
 from backend.database import Base
 
@@ -29,6 +29,15 @@ class Product(Base):
     
     # Relacionamento com OrderItem
     order_items = relationship("OrderItem", back_populates="product")
+    
+    # Índices compostos para paginação por cursor (sort key, id),
+    # com e sem filtro de categoria
+    __table_args__ = (
+        Index("ix_products_price_id", "price", "id"),
+        Index("ix_products_name_id", "name", "id"),
+        Index("ix_products_category_price_id", "category", "price", "id"),
+        Index("ix_products_category_name_id", "category", "name", "id"),
+    )
 
 class Coupon(Base):
     __tablename__ = "coupons"
@@ -53,6 +62,11 @@ class Order(Base):
     # Relacionamentos
     user = relationship("User")
     items = relationship("OrderItem", back_populates="order", cascade="all, delete-orphan")
+    
+    # Exportação percorre os pedidos por (created_at, id)
+    __table_args__ = (
+        Index("ix_orders_created_at_id", "created_at", "id"),
+    )
 
 class OrderItem(Base):
     __tablename__ = "order_items"
@@ -66,4 +80,54 @@ class OrderItem(Base):
     
     # Relacionamentos
     order = relationship("Order", back_populates="items")
-    product = relationship("Product", back_populates="order_items")
\ No newline at end of file
+    product = relationship("Product", back_populates="order_items")
+    
+    # Itens carregados em lote pelos IDs dos pedidos
+    __table_args__ = (
+        Index("ix_order_items_order_id", "order_id"),
+    )
+
+class CatalogState(Base):
+    __tablename__ = "catalog_state"
+    
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)  # Incrementada a cada alteração do catálogo
+
+class ProductCounter(Base):
+    __tablename__ = "product_counters"
+    
+    scope = Column(String(100), primary_key=True)  # "*" = todos os produtos; demais = categoria
+    total = Column(Integer, nullable=False, default=0)
+
+class DailySales(Base):
+    __tablename__ = "sales_daily"
+    
+    day = Column(Date, primary_key=True)  # Data (UTC) de criação dos pedidos
+    order_count = Column(Integer, nullable=False, default=0)
+    units = Column(Integer, nullable=False, default=0)
+    revenue = Column(DECIMAL(14, 2, asdecimal=True), nullable=False, default=Decimal('0.00'))  # Soma dos subtotais
+    discount = Column(DECIMAL(14, 2, asdecimal=True), nullable=False, default=Decimal('0.00'))
+
+class ProductSales(Base):
+    __tablename__ = "sales_by_product"
+    
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    order_count = Column(Integer, nullable=False, default=0)
+    units = Column(Integer, nullable=False, default=0)
+    revenue = Column(DECIMAL(14, 2, asdecimal=True), nullable=False, default=Decimal('0.00'))  # Soma dos line_total
+    
+    # Ranking de produtos mais vendidos
+    __table_args__ = (
+        Index("ix_sales_by_product_revenue", "revenue"),
+        Index("ix_sales_by_product_units", "units"),
+    )
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    
+    key = Column(String(255), primary_key=True)  # Cabeçalho Idempotency-Key
+    request_hash = Column(String(64), nullable=False)  # Impede reaproveitar a chave com outro pedido
+    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False)
+    status_code = Column(Integer, nullable=False)
+    response = Column(LargeBinary, nullable=False)  # Corpo JSON devolvido na repetição
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
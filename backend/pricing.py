@@ -0,0 +1,94 @@
+import os
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Optional
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.cache import TTLCache
+from backend.models import Coupon, Product
+
+# Cupons ativos mudam raramente; a validade é conferida a cada uso. O cache
+# serve à validação e à cotação; a confirmação de pedidos sempre lê o banco
+COUPON_CACHE_SIZE = int(os.getenv("COUPON_CACHE_SIZE", "256"))
+COUPON_CACHE_TTL_SECONDS = float(os.getenv("COUPON_CACHE_TTL_SECONDS", "60"))
+coupon_cache = TTLCache(maxsize=COUPON_CACHE_SIZE, ttl=COUPON_CACHE_TTL_SECONDS)
+
+CENTS = Decimal('0.01')
+
+def group_quantities(items: list) -> dict:
+    """Soma as linhas repetidas do mesmo produto: {product_id: quantidade}"""
+    quantities = {}
+    for item in items:
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+    return quantities
+
+async def load_products(db: AsyncSession, product_ids) -> dict:
+    """Carrega os produtos em uma única consulta: {id: produto}"""
+    return {
+        product.id: product
+        for product in (await db.scalars(select(Product).where(Product.id.in_(product_ids)))).all()
+    }
+
+async def find_coupon(db: AsyncSession, code: str, use_cache: bool = True) -> Optional[tuple]:
+    """Cupom ativo pelo código (sem diferenciar maiúsculas), com cache.
+
+    Retorna (código, percentual, válido até) ou None se não existir/inativo.
+    use_cache=False lê sempre do banco (confirmação de pedidos).
+    """
+    key = code.lower()
+    cached = coupon_cache.get(key) if use_cache else None
+    if cached is None:
+        coupon = await db.scalar(select(Coupon).where(
+            func.lower(Coupon.code) == key,
+            Coupon.active == True
+        ))
+        # Tupla vazia marca cupom inexistente (None é o "não está no cache")
+        cached = (coupon.code, coupon.discount_percent, coupon.valid_until) if coupon else ()
+        coupon_cache.set(key, cached)
+    return cached or None
+
+def coupon_expired(coupon: tuple) -> bool:
+    """Verifica se o cupom já passou da validade"""
+    valid_until = coupon[2]
+    return bool(valid_until) and valid_until < datetime.utcnow()
+
+def coupon_status(code: str, coupon: Optional[tuple]) -> dict:
+    """Resultado da validação do cupom no formato de CouponValidateResponse"""
+    if not coupon:
+        return {"valid": False, "discount_percent": 0, "code": code, "message": "Cupom não encontrado ou inativo"}
+    if coupon_expired(coupon):
+        return {"valid": False, "discount_percent": 0, "code": code, "message": "Cupom expirado"}
+    return {"valid": True, "discount_percent": coupon[1], "code": coupon[0], "message": "Cupom válido"}
+
+def price_cart(products: dict, quantities: dict, coupon: Optional[tuple]) -> dict:
+    """Calcula linhas, subtotal, desconto e total de um carrinho.
+
+    Usado pela cotação e pela confirmação de pedidos. Produtos ausentes de
+    products ficam fora das linhas; cupom expirado não gera desconto.
+    """
+    subtotal = Decimal('0.00')
+    lines = []
+    for product_id, quantity in quantities.items():
+        product = products.get(product_id)
+        if product is None:
+            continue
+        line_total = product.price * quantity
+        subtotal += line_total
+        lines.append({
+            "product_id": product.id,
+            "product": product,
+            "name": product.name,
+            "quantity": quantity,
+            "unit_price": product.price,
+            "line_total": line_total
+        })
+
+    discount_percent = coupon[1] if coupon and not coupon_expired(coupon) else 0
+    discount_amount = (subtotal * Decimal(str(discount_percent)) / Decimal('100')).quantize(CENTS, rounding=ROUND_HALF_UP)
+    return {
+        "lines": lines,
+        "discount_percent": discount_percent,
+        "subtotal": subtotal.quantize(CENTS, rounding=ROUND_HALF_UP),
+        "discount_amount": discount_amount,
+        "total_final": (subtotal - discount_amount).quantize(CENTS, rounding=ROUND_HALF_UP)
+    }
@@ -0,0 +1,105 @@
+import logging
+import os
+import re
+import time
+from contextvars import ContextVar
+from typing import Optional
+from sqlalchemy import event
+
+# Modo debug: adiciona o cabeçalho Server-Timing com o tempo gasto no banco
+DEBUG = os.getenv("DEBUG", "false").lower() in ("1", "true", "yes")
+# Consultas acima deste tempo vão para o log (0 = registra todas; negativo = desliga)
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+SLOW_QUERY_MAX_CHARS = 1000
+
+logger = logging.getLogger("backend.sql")
+
+class QueryProfile:
+    """Consultas executadas durante uma requisição"""
+    __slots__ = ("scope", "count", "seconds")
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.count = 0
+        self.seconds = 0.0
+
+    @property
+    def route(self) -> str:
+        """Template da rota (o roteador o coloca no scope) ou o caminho da URL"""
+        route = self.scope.get("route")
+        return route.path_format if route is not None else self.scope.get("path", "-")
+
+current_profile: ContextVar[Optional[QueryProfile]] = ContextVar("current_profile", default=None)
+
+def parameter_shape(parameters) -> str:
+    """Formato dos parâmetros (tipos, sem valores), ex.: '(int, str)' ou '20 x (int, int)'"""
+    if isinstance(parameters, (list, tuple)) and parameters and isinstance(parameters[0], (dict, list, tuple)):
+        return f"{len(parameters)} x {parameter_shape(parameters[0])}"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        return "(" + ", ".join(type(value).__name__ for value in parameters) + ")"
+    return type(parameters).__name__
+
+# O início fica no contexto da execução (descartado junto com ela), e não na
+# conexão: uma consulta que falha não chama after_cursor_execute
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.query_started = time.perf_counter()
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "query_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    profile = current_profile.get()
+    if profile is not None:
+        profile.count += 1
+        profile.seconds += elapsed
+    if SLOW_QUERY_MS >= 0 and elapsed * 1000 >= SLOW_QUERY_MS:
+        logger.warning(
+            "Consulta lenta (%.1f ms) em %s: %s | parâmetros: %s",
+            elapsed * 1000,
+            profile.route if profile is not None else "-",
+            re.sub(r"\s+", " ", statement)[:SLOW_QUERY_MAX_CHARS],
+            parameter_shape(parameters)
+        )
+
+def instrument_engine(engine):
+    """Liga a contagem/tempo de consultas e o log de consultas lentas no engine (síncrono)"""
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+
+class QueryProfilerMiddleware:
+    """Middleware ASGI que acumula as consultas de cada requisição.
+
+    Em modo debug devolve o total no cabeçalho Server-Timing
+    (consultas executadas até o envio dos cabeçalhos da resposta).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = QueryProfile(scope)
+        token = current_profile.set(profile)
+        started = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                timing = (
+                    f'db;dur={profile.seconds * 1000:.2f};desc="{profile.count} consultas", '
+                    f"app;dur={(time.perf_counter() - started) * 1000:.2f}"
+                )
+                message["headers"] = [*message.get("headers", []), (b"server-timing", timing.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing if DEBUG else send)
+        finally:
+            current_profile.reset(token)
@@ -0,0 +1,123 @@
+"""Consolidados de vendas (por dia e por produto), mantidos a cada pedido confirmado.
+
+Reconstrução a partir do histórico: python -m backend.sales [--batch-size 5000]
+"""
+import argparse
+import os
+from collections import defaultdict
+from decimal import Decimal
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+from backend.database import SessionLocal, create_tables, dialect_insert
+from backend.models import DailySales, ProductSales, Order, OrderItem
+
+# Pedidos lidos por lote na reconstrução
+SALES_REBUILD_BATCH_SIZE = int(os.getenv("SALES_REBUILD_BATCH_SIZE", "5000"))
+
+def new_daily_totals() -> dict:
+    """Totais zerados de um dia"""
+    return {"order_count": 0, "units": 0, "revenue": Decimal("0.00"), "discount": Decimal("0.00")}
+
+def new_product_totals() -> dict:
+    """Totais zerados de um produto"""
+    return {"order_count": 0, "units": 0, "revenue": Decimal("0.00")}
+
+def add_to_rollups(db: Session, daily: dict, products: dict):
+    """Soma os totais aos consolidados ({dia: totais} e {product_id: totais}), na transação atual"""
+    for model, key, totals in ((DailySales, "day", daily), (ProductSales, "product_id", products)):
+        if not totals:
+            continue
+        statement = dialect_insert(db, model)
+        columns = list(next(iter(totals.values())))
+        db.execute(
+            statement.on_conflict_do_update(
+                index_elements=[getattr(model, key)],
+                set_={column: getattr(model, column) + statement.excluded[column] for column in columns}
+            ),
+            [{key: value, **row} for value, row in totals.items()]
+        )
+
+def record_sale(db: Session, order: Order, order_items_data: list):
+    """Atualiza os consolidados com um pedido recém-gravado (mesma transação do pedido)"""
+    daily = new_daily_totals()
+    daily.update(
+        order_count=1,
+        units=sum(item_data["quantity"] for item_data in order_items_data),
+        revenue=order.subtotal,
+        discount=order.discount_amount
+    )
+    products = {
+        item_data["product_id"]: {
+            "order_count": 1,
+            "units": item_data["quantity"],
+            "revenue": item_data["line_total"]
+        }
+        for item_data in order_items_data
+    }
+    add_to_rollups(db, {order.created_at.date(): daily}, products)
+
+def rebuild_sales_rollups(batch_size: int = SALES_REBUILD_BATCH_SIZE) -> int:
+    """Recalcula os consolidados a partir de orders/order_items, em lotes de pedidos.
+
+    Pedidos confirmados durante a reconstrução (ID acima do último existente no
+    início) atualizam os consolidados por conta própria e não são relidos.
+    Retorna o número de pedidos processados.
+    """
+    db = SessionLocal()
+    try:
+        db.execute(delete(DailySales))
+        db.execute(delete(ProductSales))
+        last_id = db.scalar(select(func.max(Order.id))) or 0
+        db.commit()
+
+        processed = 0
+        after_id = 0
+        while after_id < last_id:
+            orders = db.execute(
+                select(Order.id, Order.created_at, Order.subtotal, Order.discount_amount)
+                .where(Order.id > after_id, Order.id <= last_id)
+                .order_by(Order.id)
+                .limit(batch_size)
+            ).all()
+            if not orders:
+                break
+            after_id = orders[-1].id
+
+            daily = defaultdict(new_daily_totals)
+            order_days = {}
+            for order in orders:
+                day = order.created_at.date()
+                order_days[order.id] = day
+                daily[day]["order_count"] += 1
+                daily[day]["revenue"] += order.subtotal
+                daily[day]["discount"] += order.discount_amount
+
+            products = defaultdict(new_product_totals)
+            items = db.execute(
+                select(OrderItem.order_id, OrderItem.product_id, OrderItem.quantity, OrderItem.line_total)
+                .where(OrderItem.order_id.between(orders[0].id, after_id))
+            )
+            for item in items:
+                daily[order_days[item.order_id]]["units"] += item.quantity
+                totals = products[item.product_id]
+                totals["order_count"] += 1
+                totals["units"] += item.quantity
+                totals["revenue"] += item.line_total
+
+            add_to_rollups(db, daily, products)
+            db.commit()
+            processed += len(orders)
+        return processed
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconstrói os consolidados de vendas a partir dos pedidos")
+    parser.add_argument("--batch-size", type=int, default=SALES_REBUILD_BATCH_SIZE)
+    args = parser.parse_args()
+    create_tables()
+    total = rebuild_sales_rollups(args.batch_size)
+    print(f"✅ Consolidados de vendas reconstruídos a partir de {total} pedidos")
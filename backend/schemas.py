@@ -1,7 +1,8 @@
-from datetime import datetime
+from datetime import date, datetime
 from decimal import Decimal
 from typing import Optional, List
-from pydantic import BaseModel, EmailStr, Field, validator
+from pydantic import BaseModel, EmailStr, Field, conint, validator
+from backend.catalog import PRODUCT_BATCH_MAX_IDS
 
 # Schemas de Usuário
 class UserCreate(BaseModel):
@@ -73,6 +74,30 @@ class ProductsListResponse(BaseModel):
     data: List[ProductResponse]
     meta: dict
 
+# Schemas de Consulta de Produtos por IDs
+class ProductBatchRequest(BaseModel):
+    ids: List[conint(gt=0)] = Field(
+        ..., min_length=1, max_length=PRODUCT_BATCH_MAX_IDS, description="IDs dos produtos, na ordem desejada"
+    )
+
+class ProductBatchResponse(BaseModel):
+    data: List[ProductResponse]
+    missing_ids: List[int]
+
+# Schemas de Importação de Produtos
+class ProductImportError(BaseModel):
+    line: int
+    sku: Optional[str]
+    errors: List[str]
+
+class ProductImportResponse(BaseModel):
+    processed: int
+    created: int
+    updated: int
+    failed: int
+    errors: List[ProductImportError]
+    errors_truncated: bool
+
 # Schemas de Cupom
 class CouponValidateResponse(BaseModel):
     valid: bool
@@ -80,6 +105,25 @@ class CouponValidateResponse(BaseModel):
     code: str
     message: Optional[str] = None
 
+# Schemas de Carrinho
+class CartQuoteItem(BaseModel):
+    product_id: int
+    name: str
+    quantity: int
+    unit_price: str
+    line_total: str
+    stock: int
+    available: bool
+
+class CartQuoteResponse(BaseModel):
+    items: List[CartQuoteItem]
+    missing_product_ids: List[int]
+    coupon: Optional[CouponValidateResponse] = None
+    subtotal: str
+    discount_amount: str
+    total_final: str
+    can_checkout: bool
+
 # Schemas de Pedido
 class OrderItemCreate(BaseModel):
     product_id: int = Field(..., gt=0, description="ID do produto")
@@ -112,6 +156,23 @@ class OrderResponse(BaseModel):
     class Config:
         from_attributes = True
 
+# Schemas de Relatórios de Vendas
+class DailySalesResponse(BaseModel):
+    day: date
+    order_count: int
+    units: int
+    revenue: str
+    discount: str
+    net_revenue: str
+
+class TopProductResponse(BaseModel):
+    product_id: int
+    name: Optional[str]
+    sku: Optional[str]
+    order_count: int
+    units: int
+    revenue: str
+
 # Schemas de Autenticação
 class Token(BaseModel):
     access_token: str
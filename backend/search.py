@@ -0,0 +1,110 @@
+import re
+from typing import Optional
+from sqlalchemy import column, select, table, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+from backend.database import engine
+from backend.models import Product
+
+# Tabela virtual FTS5 (rowid = products.id). A coluna oculta "rank" é o bm25.
+products_fts = table("products_fts", column("rowid"), column("rank"))
+
+# Indica se o SQLite em uso possui o módulo FTS5
+_fts_available = False
+
+def create_search_index():
+    """Cria a tabela FTS5 de produtos e a popula caso tenha acabado de ser criada"""
+    global _fts_available
+    if engine.dialect.name != "sqlite":
+        _fts_available = False
+        return
+
+    with engine.begin() as conn:
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'products_fts'")
+        ).first()
+        if not exists:
+            try:
+                conn.execute(text(
+                    "CREATE VIRTUAL TABLE products_fts USING fts5("
+                    "name, description, category, sku, "
+                    "tokenize = 'unicode61 remove_diacritics 2')"
+                ))
+            except OperationalError:
+                # SQLite compilado sem FTS5: busca cai para LIKE
+                _fts_available = False
+                return
+            conn.execute(text(
+                "INSERT INTO products_fts (rowid, name, description, category, sku) "
+                "SELECT id, name, description, category, sku FROM products"
+            ))
+    _fts_available = True
+
+def fts_enabled() -> bool:
+    """Retorna True se a busca full-text estiver disponível"""
+    return _fts_available
+
+def index_product(db: Session, product: Product):
+    """Insere ou atualiza o produto no índice de busca (na transação atual)"""
+    if not _fts_available:
+        return
+    db.execute(text("DELETE FROM products_fts WHERE rowid = :id"), {"id": product.id})
+    db.execute(
+        text(
+            "INSERT INTO products_fts (rowid, name, description, category, sku) "
+            "VALUES (:id, :name, :description, :category, :sku)"
+        ),
+        {
+            "id": product.id,
+            "name": product.name,
+            "description": product.description,
+            "category": product.category,
+            "sku": product.sku
+        }
+    )
+
+def index_products(db: Session, rows: list):
+    """Reindexa vários produtos de uma vez (dicts com id, name, description, category e sku)"""
+    if not _fts_available or not rows:
+        return
+    db.execute(text("DELETE FROM products_fts WHERE rowid = :id"), [{"id": row["id"]} for row in rows])
+    db.execute(
+        text(
+            "INSERT INTO products_fts (rowid, name, description, category, sku) "
+            "VALUES (:id, :name, :description, :category, :sku)"
+        ),
+        rows
+    )
+
+def index_product_range(db: Session, first_id: int, last_id: int):
+    """Indexa de uma vez os produtos com ID no intervalo (cargas em massa)"""
+    if not _fts_available:
+        return
+    db.execute(
+        text(
+            "INSERT INTO products_fts (rowid, name, description, category, sku) "
+            "SELECT id, name, description, category, sku FROM products WHERE id BETWEEN :first AND :last"
+        ),
+        {"first": first_id, "last": last_id}
+    )
+
+def remove_product(db: Session, product_id: int):
+    """Remove o produto do índice de busca (na transação atual)"""
+    if not _fts_available:
+        return
+    db.execute(text("DELETE FROM products_fts WHERE rowid = :id"), {"id": product_id})
+
+def build_match_query(term: str) -> Optional[str]:
+    """Converte o termo digitado em consulta MATCH com prefixo em cada palavra"""
+    tokens = re.findall(r"\w+", term)
+    if not tokens:
+        return None
+    return " ".join(f'"{token}"*' for token in tokens)
+
+def match_subquery(match: str):
+    """Subquery (product_id, rank) com os produtos que casam com a busca"""
+    return (
+        select(products_fts.c.rowid.label("product_id"), products_fts.c.rank.label("rank"))
+        .where(text("products_fts MATCH :fts_query").bindparams(fts_query=match))
+        .subquery("fts")
+    )
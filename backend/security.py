@@ -1,12 +1,18 @@
+import asyncio
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
-from backend.database import get_db
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.cache import TTLCache
+from backend.database import get_async_db
+from backend.metrics import register_cache
 from backend.models import User
 
 # Configurações JWT
@@ -14,8 +20,23 @@ JWT_SECRET = os.getenv("JWT_SECRET", "sua_chave_secreta_super_segura_para_desenv
 JWT_ALGORITHM = os.getenv("JWT_ALGO", "HS256")
 JWT_EXPIRES_MINUTES = int(os.getenv("JWT_EXPIRES_MIN", "120"))  # 2 horas
 
-# Configuração do hash de senha
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Configuração do hash de senha (custo do bcrypt ajustável por ambiente)
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+# Pool dedicado para o bcrypt (libera o GIL, então threads bastam) com fila limitada
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "32"))
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+_hash_pending = 0
+
+# Cache de tokens decodificados (token -> user_id) e de usuários autenticados
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "1024"))
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+token_cache = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL_SECONDS)
+user_cache = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL_SECONDS)
+register_cache("auth_tokens", token_cache)
+register_cache("auth_users", user_cache)
 
 # Configuração do Bearer token
 security = HTTPBearer()
@@ -28,6 +49,30 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verifica se a senha corresponde ao hash"""
     return pwd_context.verify(plain_password, hashed_password)
 
+async def _run_in_hash_pool(func, *args):
+    """Executa func no pool do bcrypt ou retorna 503 se o pool estiver saturado"""
+    global _hash_pending
+    if _hash_pending >= PASSWORD_HASH_WORKERS + PASSWORD_HASH_MAX_QUEUE:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Servidor ocupado, tente novamente em instantes",
+            headers={"Retry-After": "1"},
+        )
+    _hash_pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_hash_executor, func, *args)
+    finally:
+        _hash_pending -= 1
+
+async def hash_password_async(password: str) -> str:
+    """Gera hash da senha fora do event loop"""
+    return await _run_in_hash_pool(hash_password, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verifica a senha fora do event loop"""
+    return await _run_in_hash_pool(verify_password, plain_password, hashed_password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Cria token JWT"""
     to_encode = data.copy()
@@ -44,16 +89,15 @@ def verify_token(token: str) -> Optional[dict]:
     """Verifica e decodifica token JWT"""
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        user_id: int = payload.get("sub")
-        if user_id is None:
-            return None
-        return {"user_id": user_id}
-    except JWTError:
+        # "sub" é string no JWT; a coluna users.id é inteira (asyncpg não converte)
+        user_id = int(payload.get("sub"))
+        return {"user_id": user_id, "exp": payload.get("exp")}
+    except (JWTError, TypeError, ValueError):
         return None
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> User:
     """Dependência para obter usuário atual através do JWT"""
     credentials_exception = HTTPException(
@@ -62,21 +106,42 @@ async def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    token_data = verify_token(credentials.credentials)
-    if token_data is None:
-        raise credentials_exception
+    token = credentials.credentials
+    user_id = token_cache.get(token)
+    if user_id is None:
+        token_data = verify_token(token)
+        if token_data is None:
+            raise credentials_exception
+        user_id = token_data["user_id"]
+        # Não manter o token em cache além da sua expiração
+        ttl = AUTH_CACHE_TTL_SECONDS
+        if token_data["exp"] is not None:
+            ttl = min(ttl, token_data["exp"] - time.time())
+        token_cache.set(token, user_id, ttl=ttl)
     
-    user = db.query(User).filter(User.id == token_data["user_id"]).first()
+    user = user_cache.get(user_id)
     if user is None:
-        raise credentials_exception
+        user = await db.scalar(select(User).where(User.id == user_id))
+        if user is None:
+            raise credentials_exception
+        user_cache.set(user_id, user)
     
     return user
 
-def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
+def invalidate_user(user_id):
+    """Remove o usuário do cache de autenticação"""
+    user_cache.invalidate(user_id)
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_user_on_change(mapper, connection, target):
+    invalidate_user(target.id)
+
+async def authenticate_user(db: AsyncSession, email: str, password: str) -> Optional[User]:
     """Autentica usuário com email e senha"""
-    user = db.query(User).filter(User.email == email).first()
+    user = await db.scalar(select(User).where(User.email == email))
     if not user:
         return None
-    if not verify_password(password, user.password_hash):
+    if not await verify_password_async(password, user.password_hash):
         return None
     return user
\ No newline at end of file
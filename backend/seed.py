@@ -1,20 +1,50 @@
+import argparse
 import os
+import random
 import sys
+import time
+from array import array
+from collections import defaultdict
 from datetime import datetime, timedelta
-from decimal import Decimal
+from decimal import Decimal, ROUND_HALF_UP
+from sqlalchemy import func, insert, select, text
 
 # Adicionar o diretório backend ao path para importar os módulos
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from backend.database import SessionLocal, create_tables
-from backend.models import User, Product, Coupon
+from backend.models import User, Product, Coupon, Order, OrderItem
+from backend.catalog import (
+    ensure_catalog_state, bump_catalog_version, adjust_product_counters, rebuild_product_counters
+)
+from backend.sales import add_to_rollups, new_daily_totals, new_product_totals
+from backend.search import create_search_index, index_product, index_product_range
 from backend.security import hash_password
 
+# Modo em escala: linhas por INSERT em lote e senha comum dos usuários sintéticos
+SEED_BATCH_SIZE = int(os.getenv("SEED_BATCH_SIZE", "20000"))
+SCALE_PASSWORD = "Senha123!"
+
+SCALE_CATEGORIES = [
+    "Cadernos", "Mochilas", "Canetas", "Acessórios", "Papelaria",
+    "Arte", "Livros", "Informática", "Organização", "Esportes"
+]
+SCALE_ITEMS = [
+    "Caderno", "Caneta", "Lápis", "Borracha", "Mochila", "Estojo", "Régua", "Pasta",
+    "Marca Texto", "Apontador", "Agenda", "Fichário", "Tesoura", "Cola", "Calculadora"
+]
+SCALE_ADJECTIVES = [
+    "Azul", "Vermelho", "Verde", "Preto", "Colorido", "Premium",
+    "Escolar", "Universitário", "Infantil", "Compacto", "Grande", "Econômico"
+]
+
 def create_seed_data():
     """Cria dados iniciais para o sistema"""
     
-    # Criar tabelas se não existirem
+    # Criar tabelas e índice de busca se não existirem
     create_tables()
+    create_search_index()
+    ensure_catalog_state()
     
     # Obter sessão do banco
     db = SessionLocal()
@@ -165,17 +195,24 @@ def create_seed_data():
             }
         ]
         
-        # Criar produtos (idempotente por SKU)
+        # Criar produtos (idempotente por SKU, verificados em uma única consulta)
+        existing_skus = {
+            sku for (sku,) in db.query(Product.sku).filter(
+                Product.sku.in_([product_data["sku"] for product_data in products_data])
+            )
+        }
         products_created = 0
         for product_data in products_data:
-            existing_product = db.query(Product).filter(Product.sku == product_data["sku"]).first()
-            
-            if not existing_product:
+            if product_data["sku"] not in existing_skus:
                 product = Product(**product_data)
                 db.add(product)
+                db.flush()
+                index_product(db, product)
+                adjust_product_counters(db, product.category, 1)
                 products_created += 1
         
         if products_created > 0:
+            bump_catalog_version(db)
             print(f"✅ {products_created} produtos criados")
         else:
             print("ℹ️  Produtos já existem no banco")
@@ -199,5 +236,200 @@ def create_seed_data():
     finally:
         db.close()
 
+def parse_line_distribution(spec: str):
+    """Converte '1:40,2:30,3:20,5:10' (itens:peso) em (quantidades de itens, pesos)"""
+    counts, weights = [], []
+    for part in spec.split(","):
+        count, weight = part.split(":")
+        if int(count) < 1 or float(weight) < 0:
+            raise ValueError(f"Distribuição de itens inválida: {part}")
+        counts.append(int(count))
+        weights.append(float(weight))
+    return counts, weights
+
+def next_id(db, model) -> int:
+    """Primeiro ID livre da tabela (as cargas em massa usam IDs explícitos)"""
+    return (db.scalar(select(func.max(model.id))) or 0) + 1
+
+def sync_sequence(db, table_name: str):
+    """No Postgres, avança a sequência do ID após inserções com ID explícito"""
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table_name}', 'id'), (SELECT MAX(id) FROM {table_name}))"
+        ))
+
+def create_scale_data(
+    products: int = 100000,
+    users: int = 1000,
+    orders: int = 100000,
+    lines: str = "1:40,2:30,3:20,5:10",
+    seed: int = 42,
+    days: int = 90,
+    until: datetime = None,
+    batch_size: int = SEED_BATCH_SIZE
+):
+    """Gera produtos, usuários e pedidos sintéticos em volume, com INSERTs em lote.
+
+    A mesma semente (e a mesma data final) gera sempre os mesmos dados.
+    """
+    create_tables()
+    create_search_index()
+    ensure_catalog_state()
+
+    rng = random.Random(seed)
+    line_counts, line_weights = parse_line_distribution(lines)
+    until = until or datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    sku_prefix = f"SCL{seed}-"
+    db = SessionLocal()
+
+    try:
+        if db.scalar(select(Product.id).where(Product.sku == f"{sku_prefix}{1:07d}")):
+            print(f"ℹ️  Dados em escala já existem para a semente {seed}")
+            return
+        print(f"🌱 Gerando {products} produtos, {users} usuários e {orders} pedidos (semente {seed})...")
+        started = time.perf_counter()
+        now = datetime.utcnow()
+
+        # Produtos (preços guardados em centavos para montar os pedidos)
+        first_product_id = next_id(db, Product)
+        prices = array("i")
+        for start in range(0, products, batch_size):
+            rows = []
+            for index in range(start, min(start + batch_size, products)):
+                item, adjective = rng.choice(SCALE_ITEMS), rng.choice(SCALE_ADJECTIVES)
+                cents = rng.randint(150, 50000)
+                prices.append(cents)
+                rows.append({
+                    "id": first_product_id + index,
+                    "name": f"{item} {adjective} {index + 1}",
+                    "description": f"{item} {adjective.lower()} para uso escolar",
+                    "price": Decimal(cents).scaleb(-2),
+                    "stock": rng.randint(0, 500),
+                    "category": rng.choice(SCALE_CATEGORIES),
+                    "sku": f"{sku_prefix}{index + 1:07d}",
+                    "image_url": None,
+                    "created_at": now,
+                    "updated_at": now
+                })
+            db.execute(insert(Product.__table__), rows)
+            db.commit()
+        if products:
+            index_product_range(db, first_product_id, first_product_id + products - 1)
+            rebuild_product_counters(db)
+            bump_catalog_version(db)
+            sync_sequence(db, "products")
+            db.commit()
+        print(f"✅ {products} produtos criados ({time.perf_counter() - started:.1f}s)")
+
+        # Usuários: bcrypt calculado uma única vez e reaproveitado
+        first_user_id = next_id(db, User)
+        password_hash = hash_password(SCALE_PASSWORD)
+        for start in range(0, users, batch_size):
+            db.execute(insert(User.__table__), [
+                {
+                    "id": first_user_id + index,
+                    "name": f"Aluno {index + 1}",
+                    "email": f"aluno{index + 1}.s{seed}@example.com",
+                    "password_hash": password_hash,
+                    "created_at": now
+                }
+                for index in range(start, min(start + batch_size, users))
+            ])
+            db.commit()
+        sync_sequence(db, "users")
+        db.commit()
+        print(f"✅ {users} usuários criados, senha {SCALE_PASSWORD} ({time.perf_counter() - started:.1f}s)")
+
+        # Pedidos e itens, com os consolidados de vendas acumulados em memória
+        if products and orders:
+            first_order_id = next_id(db, Order)
+            span_seconds = days * 24 * 60 * 60
+            daily = defaultdict(new_daily_totals)
+            product_totals = defaultdict(new_product_totals)
+            lines_created = 0
+            for start in range(0, orders, batch_size):
+                order_rows, item_rows = [], []
+                for index in range(start, min(start + batch_size, orders)):
+                    order_id = first_order_id + index
+                    created_at = until - timedelta(seconds=rng.randrange(span_seconds))
+                    line_count = min(rng.choices(line_counts, line_weights)[0], products)
+                    subtotal = Decimal("0.00")
+                    units = 0
+                    for product_index in rng.sample(range(products), line_count):
+                        product_id = first_product_id + product_index
+                        quantity = rng.randint(1, 3)
+                        unit_price = Decimal(prices[product_index]).scaleb(-2)
+                        line_total = unit_price * quantity
+                        item_rows.append({
+                            "order_id": order_id,
+                            "product_id": product_id,
+                            "quantity": quantity,
+                            "unit_price": unit_price,
+                            "line_total": line_total
+                        })
+                        totals = product_totals[product_id]
+                        totals["order_count"] += 1
+                        totals["units"] += quantity
+                        totals["revenue"] += line_total
+                        subtotal += line_total
+                        units += quantity
+                    # 20% dos pedidos com o cupom de 10%
+                    discount = Decimal("0.00")
+                    if rng.random() < 0.2:
+                        discount = (subtotal * Decimal("0.10")).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+                    order_rows.append({
+                        "id": order_id,
+                        "user_id": first_user_id + rng.randrange(users) if users else None,
+                        "subtotal": subtotal,
+                        "discount_amount": discount,
+                        "total_final": subtotal - discount,
+                        "created_at": created_at
+                    })
+                    totals = daily[created_at.date()]
+                    totals["order_count"] += 1
+                    totals["units"] += units
+                    totals["revenue"] += subtotal
+                    totals["discount"] += discount
+                db.execute(insert(Order.__table__), order_rows)
+                db.execute(insert(OrderItem.__table__), item_rows)
+                db.commit()
+                lines_created += len(item_rows)
+            add_to_rollups(db, daily, product_totals)
+            sync_sequence(db, "orders")
+            db.commit()
+            print(f"✅ {orders} pedidos e {lines_created} itens criados ({time.perf_counter() - started:.1f}s)")
+
+        print("🎉 Dados em escala gerados com sucesso!")
+
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Erro durante a geração em escala: {e}")
+        raise e
+    finally:
+        db.close()
+
 if __name__ == "__main__":
-    create_seed_data()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Cria os dados iniciais e, opcionalmente, dados sintéticos em volume")
+    parser.add_argument("--scale", action="store_true", help="Gerar também dados sintéticos em volume")
+    parser.add_argument("--products", type=int, default=100000, help="Quantidade de produtos")
+    parser.add_argument("--users", type=int, default=1000, help="Quantidade de usuários")
+    parser.add_argument("--orders", type=int, default=100000, help="Quantidade de pedidos")
+    parser.add_argument("--lines", default="1:40,2:30,3:20,5:10", help="Distribuição de itens por pedido (itens:peso,...)")
+    parser.add_argument("--seed", type=int, default=42, help="Semente do gerador (dados reproduzíveis)")
+    parser.add_argument("--days", type=int, default=90, help="Pedidos espalhados pelos últimos N dias")
+    parser.add_argument("--until", type=datetime.fromisoformat, default=None, help="Data final dos pedidos (padrão: hoje)")
+    parser.add_argument("--batch-size", type=int, default=SEED_BATCH_SIZE, help="Linhas por INSERT em lote")
+    args = parser.parse_args()
+
+    create_seed_data()
+    if args.scale:
+        create_scale_data(
+            products=args.products,
+            users=args.users,
+            orders=args.orders,
+            lines=args.lines,
+            seed=args.seed,
+            days=args.days,
+            until=args.until,
+            batch_size=args.batch_size
+        )
\ No newline at end of file
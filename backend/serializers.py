@@ -0,0 +1,63 @@
+from decimal import Decimal, ROUND_HALF_UP
+from operator import attrgetter
+import orjson
+from fastapi import Response
+from backend.models import Product, Order
+
+# Campos lidos de uma vez por produto (evita um getattr por chave)
+_product_fields = attrgetter(
+    "id", "name", "description", "price", "stock", "category",
+    "sku", "image_url", "created_at", "updated_at"
+)
+
+def serialize_decimal(value: Decimal) -> str:
+    """Serializa Decimal para string"""
+    return str(value.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP))
+
+def serialize_product(product: Product) -> dict:
+    """Payload de produto no formato de ProductResponse"""
+    (product_id, name, description, price, stock, category,
+     sku, image_url, created_at, updated_at) = _product_fields(product)
+    return {
+        "id": product_id,
+        "name": name,
+        "description": description,
+        "price": serialize_decimal(price),
+        "stock": stock,
+        "category": category,
+        "sku": sku,
+        "image_url": image_url,
+        "created_at": created_at,
+        "updated_at": updated_at
+    }
+
+def serialize_order(order: Order, items: list) -> dict:
+    """Payload de pedido no formato de OrderResponse (itens com produto carregado)"""
+    return {
+        "id": order.id,
+        "user_id": order.user_id,
+        "subtotal": serialize_decimal(order.subtotal),
+        "discount_amount": serialize_decimal(order.discount_amount),
+        "total_final": serialize_decimal(order.total_final),
+        "created_at": order.created_at,
+        "items": [
+            {
+                "id": item.id,
+                "product_id": item.product_id,
+                "quantity": item.quantity,
+                "unit_price": serialize_decimal(item.unit_price),
+                "line_total": serialize_decimal(item.line_total),
+                "product": serialize_product(item.product)
+            }
+            for item in items
+        ]
+    }
+
+def dump_json(content) -> bytes:
+    """Serializa o payload com orjson (datetime em ISO 8601, como o Pydantic)"""
+    return orjson.dumps(content)
+
+def json_response(content, status_code: int = 200, headers: dict = None) -> Response:
+    """Resposta JSON já serializada, sem a segunda validação do response_model"""
+    body = content if isinstance(content, bytes) else dump_json(content)
+    return Response(content=body, status_code=status_code, headers=headers, media_type="application/json")
@@ -0,0 +1,64 @@
+import os
+import tempfile
+import uuid
+from decimal import Decimal
+
+# Banco temporário: precisa ser definido antes de importar o backend
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='loja-testes-')}/test.db"
+
+import httpx
+import pytest
+from backend.app import app
+from backend.checkout import checkout_pipeline
+from backend.database import SessionLocal, async_engine
+from backend.models import Product
+
+@pytest.fixture(scope="session")
+def anyio_backend():
+    return "asyncio"
+
+@pytest.fixture(scope="session", autouse=True)
+async def dispose_async_engine(anyio_backend):
+    """Fecha o pool assíncrono no fim da sessão (as threads do aiosqlite impediriam a saída)"""
+    yield
+    await async_engine.dispose()
+
+@pytest.fixture
+async def client():
+    """Cliente HTTP ligado ao app em processo (sem servidor)"""
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://testes") as client:
+        yield client
+
+@pytest.fixture(params=[False, True], ids=["direto", "pipeline"])
+async def checkout_mode(request):
+    """Executa o teste com a confirmação direta e com o pipeline (CHECKOUT_PIPELINE=true)"""
+    checkout_pipeline.enabled = request.param
+    yield request.param
+    await checkout_pipeline.stop()
+    checkout_pipeline.enabled = False
+
+@pytest.fixture
+def make_products():
+    """Cria produtos novos e retorna seus IDs"""
+    def make(count: int, stock: int = 1000, price: str = "10.00") -> list:
+        db = SessionLocal()
+        try:
+            products = [
+                Product(name=f"Produto de teste {index}", price=Decimal(price), stock=stock,
+                        category="Testes", sku=f"TST-{uuid.uuid4().hex[:12]}")
+                for index in range(count)
+            ]
+            db.add_all(products)
+            db.commit()
+            return [product.id for product in products]
+        finally:
+            db.close()
+    return make
+
+def product_stock(product_id: int) -> int:
+    """Estoque atual lido direto do banco"""
+    db = SessionLocal()
+    try:
+        return db.get(Product, product_id).stock
+    finally:
+        db.close()
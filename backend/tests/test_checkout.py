@@ -0,0 +1,77 @@
+import asyncio
+import uuid
+from collections import Counter
+import pytest
+from sqlalchemy import event
+from backend.database import async_engine
+from backend.tests.conftest import product_stock
+
+pytestmark = pytest.mark.anyio
+
+# Consultas de uma confirmação sem cupom: SELECT dos produtos, UPDATE do estoque,
+# INSERT do pedido, INSERT dos itens, 2 upserts dos consolidados de vendas e
+# UPDATE da versão do catálogo
+CONFIRM_STATEMENTS = 7
+
+async def test_parallel_checkouts_do_not_oversell(client, checkout_mode, make_products):
+    """40 confirmações simultâneas de um produto com 5 unidades: só 5 pedidos passam"""
+    (product_id,) = make_products(1, stock=5)
+    payload = {"items": [{"product_id": product_id, "quantity": 1}]}
+
+    responses = await asyncio.gather(*(client.post("/orders/confirm", json=payload) for _ in range(40)))
+
+    statuses = Counter(response.status_code for response in responses)
+    assert statuses == {201: 5, 409: 35}
+    assert product_stock(product_id) == 0
+    created = [response.json() for response in responses if response.status_code == 201]
+    assert len({order["id"] for order in created}) == 5
+    # A resposta traz o estoque já decrementado por este pedido
+    assert sorted(order["items"][0]["product"]["stock"] for order in created) == [0, 1, 2, 3, 4]
+
+async def test_idempotency_key_creates_a_single_order(client, checkout_mode, make_products):
+    """Repetições simultâneas da mesma Idempotency-Key geram um pedido; as demais repetem a resposta"""
+    (product_id,) = make_products(1, stock=50)
+    payload = {"items": [{"product_id": product_id, "quantity": 1}]}
+    headers = {"Idempotency-Key": f"teste-{uuid.uuid4()}"}
+
+    responses = await asyncio.gather(
+        *(client.post("/orders/confirm", json=payload, headers=headers) for _ in range(20))
+    )
+
+    assert {response.status_code for response in responses} == {201}
+    assert len({response.content for response in responses}) == 1
+    replayed = Counter(response.headers.get("Idempotent-Replayed") for response in responses)
+    assert replayed == {None: 1, "true": 19}
+    assert product_stock(product_id) == 49
+
+    # Repetição posterior devolve o corpo gravado sem tocar no estoque
+    replay = await client.post("/orders/confirm", json=payload, headers=headers)
+    assert replay.status_code == 201
+    assert replay.headers["Idempotent-Replayed"] == "true"
+    assert replay.content == responses[0].content
+
+    # Mesma chave com outro pedido é recusada
+    other = {"items": [{"product_id": product_id, "quantity": 2}]}
+    conflict = await client.post("/orders/confirm", json=other, headers=headers)
+    assert conflict.status_code == 422
+    assert product_stock(product_id) == 49
+
+@pytest.mark.parametrize("lines", [2, 20])
+async def test_confirm_statement_count_does_not_grow_with_lines(client, make_products, lines):
+    """A confirmação executa o mesmo número de consultas para 2 ou 20 linhas"""
+    product_ids = make_products(lines)
+    payload = {"items": [{"product_id": product_id, "quantity": 2} for product_id in product_ids]}
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", count_statement)
+    try:
+        response = await client.post("/orders/confirm", json=payload)
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", count_statement)
+
+    assert response.status_code == 201
+    assert len(response.json()["items"]) == lines
+    assert len(statements) == CONFIRM_STATEMENTS, statements
@@ -107,6 +107,13 @@ const apiClient = {
         return await this.call(`/coupons/${encodeURIComponent(code)}/validate`);
     },
 
+    async quoteCart(cartData) {
+        return await this.call('/cart/quote', {
+            method: 'POST',
+            body: JSON.stringify(cartData)
+        });
+    },
+
     async confirmOrder(orderData) {
         return await this.call('/orders/confirm', {
             method: 'POST',
@@ -287,8 +294,35 @@ const cartManager = {
     },
 
     updateTotals() {
-        const { subtotal, discount, total } = this.getTotalWithDiscount();
+        // Estimativa local imediata; a cotação do servidor substitui os valores
+        this.renderTotals(this.getTotalWithDiscount(), this.getCart().length > 0);
+        this.refreshQuote();
+    },
+
+    async refreshQuote() {
+        const cart = this.getCart();
+        if (cart.length === 0) return;
         
+        const coupon = this.getAppliedCoupon();
+        const requestId = (this.quoteRequestId = (this.quoteRequestId || 0) + 1);
+        try {
+            const quote = await apiClient.quoteCart({
+                items: cart.map(item => ({ product_id: item.product_id, quantity: item.quantity })),
+                coupon_code: coupon && coupon.valid ? coupon.code : null
+            });
+            // Ignorar respostas de alterações anteriores do carrinho
+            if (requestId !== this.quoteRequestId) return;
+            this.renderTotals({
+                subtotal: parseFloat(quote.subtotal),
+                discount: parseFloat(quote.discount_amount),
+                total: parseFloat(quote.total_final)
+            }, quote.can_checkout);
+        } catch (error) {
+            console.error('Erro ao cotar carrinho:', error);
+        }
+    },
+
+    renderTotals({ subtotal, discount, total }, canCheckout) {
         document.getElementById('cartSubtotal').textContent = formatCurrency(subtotal);
         document.getElementById('cartTotal').textContent = formatCurrency(total);
         
@@ -304,7 +338,7 @@ const cartManager = {
         
         // Atualizar botão de checkout
         const checkoutBtn = document.getElementById('checkoutBtn');
-        checkoutBtn.disabled = this.getCart().length === 0;
+        checkoutBtn.disabled = !canCheckout;
     }
 };
 